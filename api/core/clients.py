@@ -0,0 +1,224 @@
+import os
+import json
+import logging
+import threading
+from typing import TYPE_CHECKING, Optional, Sequence
+
+from api.core.config import CHAT_MODEL, EMBEDDING_MODEL, FIRESTORE_DATABASE, SCOPES, TOKEN_PATH
+
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+logger = logging.getLogger(__name__)
+
+# Process-wide registry of the external clients. Every client is built once and
+# reused by all requests so their HTTP connection pools (and TLS sessions) are
+# kept warm. Construction is guarded by locks because FastAPI runs sync
+# dependencies and tools in worker threads. The client libraries themselves
+# (over a second of imports) are only imported when the first client is built,
+# which the startup warm-up (api/services/warmup.py) does in the background.
+_lock = threading.Lock()
+_calendar_lock = threading.Lock()
+_thread_local = threading.local()
+
+_chat_models = {}
+_bound_chat_models = {}
+_embeddings = {}
+_firestore_client = None
+_calendar_creds = None
+# Local stand-ins installed with override_clients (e.g. by the offline benchmark in bench/)
+_overrides = {}
+
+
+def override_clients(chat_model=None, embeddings=None, firestore=None, calendar_service=None):
+    """
+    Replaces the external clients for the whole process. `chat_model` and
+    `embeddings` are factories called with the same keyword arguments as
+    ChatGoogleGenerativeAI and GoogleGenerativeAIEmbeddings; `firestore` and
+    `calendar_service` are ready-made instances. Already built clients are dropped.
+    """
+    global _firestore_client, _calendar_creds
+    with _lock:
+        _overrides.update({
+            name: value for name, value in (
+                ("chat_model", chat_model), ("embeddings", embeddings),
+                ("firestore", firestore), ("calendar_service", calendar_service),
+            ) if value is not None
+        })
+        _chat_models.clear()
+        _bound_chat_models.clear()
+        _embeddings.clear()
+        _firestore_client = None
+        _calendar_creds = None
+
+
+def get_chat_model(temperature: float = 0, tools: Sequence = ()):
+    """
+    Returns the shared Gemini chat model for this temperature, with `tools` bound
+    if given. There is one client per temperature; the tool-bound variants wrap
+    it (bind_tools), so they share its connection pool.
+    """
+    if tools:
+        key = (CHAT_MODEL, temperature, tuple(t.name for t in tools))
+        bound = _bound_chat_models.get(key)
+        if bound is None:
+            base = get_chat_model(temperature)
+            with _lock:
+                bound = _bound_chat_models.get(key)
+                if bound is None:
+                    bound = _bound_chat_models[key] = base.bind_tools(tools)
+        return bound
+
+    key = (CHAT_MODEL, temperature)
+    model = _chat_models.get(key)
+    if model is None:
+        with _lock:
+            model = _chat_models.get(key)
+            if model is None:
+                factory = _overrides.get("chat_model")
+                if factory is None:
+                    from langchain_google_genai import ChatGoogleGenerativeAI as factory
+                # Retries are done by the scheduler (api/services/scheduler.py), which also limits concurrency.
+                model = factory(model=CHAT_MODEL, temperature=temperature, max_retries=0)
+                _chat_models[key] = model
+    return model
+
+
+def get_embeddings(model: str = EMBEDDING_MODEL) -> "GoogleGenerativeAIEmbeddings":
+    """Returns the shared embeddings client for `model`."""
+    embeddings = _embeddings.get(model)
+    if embeddings is None:
+        with _lock:
+            embeddings = _embeddings.get(model)
+            if embeddings is None:
+                factory = _overrides.get("embeddings")
+                if factory is None:
+                    from langchain_google_genai import GoogleGenerativeAIEmbeddings as factory
+                embeddings = factory(model=model)
+                _embeddings[model] = embeddings
+    return embeddings
+
+
+def get_firestore():
+    """Returns the shared async Firestore client, or None if Firebase is not configured."""
+    global _firestore_client
+    if "firestore" in _overrides:
+        return _overrides["firestore"]
+    if _firestore_client is not None:
+        return _firestore_client
+    with _lock:
+        if _firestore_client is not None:
+            return _firestore_client
+        try:
+            cred_json_str = os.getenv("FIREBASE_SERVICE_ACCOUNT_JSON")
+            if cred_json_str:
+                import firebase_admin
+                from firebase_admin import credentials
+                from google.cloud import firestore as google_firestore
+
+                cred_info = json.loads(cred_json_str)
+                cred = credentials.Certificate(cred_info)
+
+                if not firebase_admin._apps:
+                    firebase_admin.initialize_app(cred)
+
+                google_auth_creds = cred.get_credential()
+
+                project_id = firebase_admin.get_app().project_id
+
+                _firestore_client = google_firestore.AsyncClient(project=project_id, database=FIRESTORE_DATABASE, credentials=google_auth_creds)
+
+                logger.info("Firebase Admin SDK initialized successfully.")
+            else:
+                logger.warning("'FIREBASE_SERVICE_ACCOUNT_JSON' environment variable not set. Chat memory (Firestore) will not work.")
+        except Exception as e:
+            logger.error("Could not initialize Firebase Admin SDK: %s", e)
+    return _firestore_client
+
+
+def _load_calendar_credentials() -> Optional["Credentials"]:
+    """
+    Loads Google Calendar credentials from an environment variable or a local file.
+    For production (Vercel), the GOOGLE_TOKEN_JSON environment variable should be used.
+    """
+    from google.oauth2.credentials import Credentials
+
+    token_json_str = os.getenv("GOOGLE_TOKEN_JSON")
+
+    if token_json_str:
+        # Load from environment variable (ideal for Vercel)
+        try:
+            token_info = json.loads(token_json_str)
+            creds = Credentials.from_authorized_user_info(token_info, SCOPES)
+            logger.info("Calendar credentials loaded from GOOGLE_TOKEN_JSON environment variable.")
+            return creds
+        except json.JSONDecodeError:
+            logger.error("The GOOGLE_TOKEN_JSON environment variable is not valid JSON.")
+            return None
+    elif os.path.exists(TOKEN_PATH):
+        # Load from local file (for development or first-time authentication)
+        creds = Credentials.from_authorized_user_file(TOKEN_PATH, SCOPES)
+        logger.info("Calendar credentials loaded from local file: %s", TOKEN_PATH)
+        return creds
+    return None
+
+
+def get_calendar_credentials() -> Optional["Credentials"]:
+    """
+    Returns the cached Google Calendar credentials, loading them on first use and
+    refreshing the access token only once it has expired. Concurrent callers
+    share a single refresh.
+    """
+    global _calendar_creds
+    creds = _calendar_creds
+    if creds and creds.valid:
+        return creds
+
+    with _calendar_lock:
+        creds = _calendar_creds
+        if creds and creds.valid:
+            return creds
+        if creds is None:
+            creds = _load_calendar_credentials()
+
+        # If credentials don't exist or are not valid, try to refresh them
+        if not creds or not creds.valid:
+            if creds and creds.expired and creds.refresh_token:
+                logger.info("Calendar credentials expired. Refreshing token.")
+                try:
+                    from google.auth.transport.requests import Request as GoogleRequest
+                    creds.refresh(GoogleRequest())
+                    # IMPORTANT: If the token is refreshed, the new state will not be saved
+                    # to the environment variable automatically. The `refresh_token` is still
+                    # valid, so it will work on the next execution.
+                except Exception as e:
+                    logger.error("Error refreshing calendar token: %s", e)
+                    return None
+            else:
+                logger.warning("No valid calendar credentials or refresh_token. Manual authentication required.")
+                # No credentials or refresh token, authentication is needed.
+                return None
+
+        _calendar_creds = creds
+        return creds
+
+
+def get_calendar_service():
+    """
+    Returns a Google Calendar API service, or None if there are no valid credentials.
+    The underlying httplib2 connection is not thread-safe, so each worker thread
+    keeps (and reuses) its own service object built from the shared credentials.
+    """
+    if "calendar_service" in _overrides:
+        return _overrides["calendar_service"]
+    creds = get_calendar_credentials()
+    if not creds:
+        return None
+    service = getattr(_thread_local, "calendar_service", None)
+    if service is None or getattr(_thread_local, "calendar_creds", None) is not creds:
+        from googleapiclient.discovery import build
+        service = build("calendar", "v3", credentials=creds, cache_discovery=False)
+        _thread_local.calendar_service = service
+        _thread_local.calendar_creds = creds
+    return service
@@ -4,10 +4,21 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
+# Logging and metrics: log level (DEBUG shows per-node traces and span timings) and the number of
+# recent samples per stage used for the p50/p95/p99 of /metrics
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "2048"))
+
 # Google Calendar OAuth settings
 SCOPES = ["https://www.googleapis.com/auth/calendar.readonly"]
 TOKEN_PATH = "token.json"
 CREDENTIALS_PATH = "credentials.json"
+# Local calendar mirror: maximum age (seconds) of the mirrored events before a query triggers a sync
+CALENDAR_MAX_STALENESS_SECONDS = int(os.getenv("CALENDAR_MAX_STALENESS_SECONDS", "60"))
+# How often (seconds) the mirror syncs in the background so queries rarely wait for a sync; 0 disables it
+CALENDAR_SYNC_INTERVAL_SECONDS = float(os.getenv("CALENDAR_SYNC_INTERVAL_SECONDS", "30"))
+# Timezone used for all-day events and "is date X free" queries
+CALENDAR_TIMEZONE = os.getenv("CALENDAR_TIMEZONE", "Europe/Madrid")
 
 # Base URL determination
 if os.getenv("VERCEL"):
@@ -25,4 +36,65 @@ ORIGINS = [
     "http://localhost:5173",
     # URL de producción del frontend en Vercel
     "https://nona-eventos-front-end.vercel.app",
-]
\ No newline at end of file
+]
+
+# Model and database settings
+CHAT_MODEL = "models/gemini-pro-latest"
+FIRESTORE_DATABASE = "chatbot-hilos"
+# Number of most recent chat turns (user + assistant messages) loaded per request
+HISTORY_WINDOW = int(os.getenv("CHAT_HISTORY_WINDOW", "20"))
+# Graph routing mode: "planner", "classifier" or "single" (see api/services/routing.py)
+ROUTING_MODE = os.getenv("ROUTING_MODE", "classifier").lower()
+# Maximum time (seconds) a single tool call may take before it is cancelled
+TOOL_TIMEOUT_SECONDS = float(os.getenv("TOOL_TIMEOUT_SECONDS", "10"))
+# Admission control for upstream (Gemini) calls: concurrent calls, callers allowed to wait for a slot,
+# longest wait before a request is shed with 429, and retries (jittered backoff) on throttling
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "16"))
+UPSTREAM_MAX_QUEUE = int(os.getenv("UPSTREAM_MAX_QUEUE", "64"))
+UPSTREAM_MAX_WAIT_SECONDS = float(os.getenv("UPSTREAM_MAX_WAIT_SECONDS", "15"))
+UPSTREAM_MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "3"))
+UPSTREAM_RETRY_BASE_SECONDS = float(os.getenv("UPSTREAM_RETRY_BASE_SECONDS", "0.5"))
+# Token budgets for the conversational context (summary + form state + recent turns) of each graph node
+AGENT_CONTEXT_TOKEN_BUDGET = int(os.getenv("AGENT_CONTEXT_TOKEN_BUDGET", "1000"))
+RESPONDER_CONTEXT_TOKEN_BUDGET = int(os.getenv("RESPONDER_CONTEXT_TOKEN_BUDGET", "2000"))
+# Once the unsummarized turns exceed this many tokens, the oldest ones are folded into the summary
+SUMMARY_TRIGGER_TOKENS = int(os.getenv("SUMMARY_TRIGGER_TOKENS", "2000"))
+# Write-behind persistence of chat turns: replies are sent before their turns reach Firestore, which
+# receives them in batch commits every interval (or sooner once this many writes are pending)
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "true").lower() == "true"
+WRITE_BEHIND_FLUSH_INTERVAL_SECONDS = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL_SECONDS", "0.25"))
+WRITE_BEHIND_MAX_PENDING_WRITES = int(os.getenv("WRITE_BEHIND_MAX_PENDING_WRITES", "200"))
+WRITE_BEHIND_MAX_RETRIES = int(os.getenv("WRITE_BEHIND_MAX_RETRIES", "5"))
+# Batch processing (POST /api/admin/chatbot/batch and `python -m api.services.batch`): sessions processed
+# in parallel, items per request, and retries of an item shed by the upstream scheduler
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+BATCH_ITEM_RETRIES = int(os.getenv("BATCH_ITEM_RETRIES", "3"))
+
+# Semantic answer cache for repeated first-turn questions
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "500"))
+
+# RAG knowledge base settings
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+# Every file in KNOWLEDGE_DIR matching KNOWLEDGE_GLOB is part of the knowledge base
+KNOWLEDGE_DIR = os.getenv("KNOWLEDGE_DIR", os.path.join(PROJECT_ROOT, "docs"))
+KNOWLEDGE_GLOB = os.getenv("KNOWLEDGE_GLOB", "info_*.md")
+# How often (seconds) the knowledge files are checked for changes to hot-reload the index; 0 disables the watcher
+KNOWLEDGE_WATCH_INTERVAL_SECONDS = float(os.getenv("KNOWLEDGE_WATCH_INTERVAL_SECONDS", "10"))
+EMBEDDING_MODEL = "models/embedding-001"
+# Maximum size (tokens) of a knowledge chunk; chunks never cross markdown sections
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "300"))
+# Number of chunks retrieved per search and token budget of the context returned by search_event_info
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "5"))
+SEARCH_CONTEXT_TOKEN_BUDGET = int(os.getenv("SEARCH_CONTEXT_TOKEN_BUDGET", "600"))
+# Hybrid retrieval: fraction of query terms the best BM25 chunk must contain to skip the embedding call
+HYBRID_KEYWORD_COVERAGE = float(os.getenv("HYBRID_KEYWORD_COVERAGE", "1.0"))
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+# Directory where prebuilt FAISS indexes are stored, keyed by content hash
+INDEX_CACHE_DIR = os.getenv("INDEX_CACHE_DIR", os.path.join(PROJECT_ROOT, ".index_cache"))
+# Cached indexes kept per embedding model (the one in use plus the most recent others); older ones are deleted
+INDEX_CACHE_KEEP = int(os.getenv("INDEX_CACHE_KEEP", "3"))
@@ -18,3 +18,21 @@ def get_api_key(api_key_header: str = Security(api_key_header)):
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or missing API Key.",
         )
+
+admin_key_header = APIKeyHeader(name="X-Admin-Key", auto_error=False)
+
+def get_admin_api_key(admin_key_header: str = Security(admin_key_header)):
+    """Admin endpoints use their own key, never shared with the frontend."""
+    admin_api_key = os.getenv("ADMIN_API_KEY")
+    if not admin_api_key:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Admin API Key not configured on the server.",
+        )
+    if admin_key_header == admin_api_key:
+        return admin_key_header
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or missing Admin API Key.",
+        )
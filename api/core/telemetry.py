@@ -0,0 +1,213 @@
+import sys
+import time
+import queue
+import atexit
+import bisect
+import inspect
+import logging
+import functools
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Iterable, Optional, Tuple
+
+from api.core.config import LOG_LEVEL, METRICS_WINDOW
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "nonaeventos"
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+_listener: Optional[QueueListener] = None
+
+
+def configure_logging(level: str = LOG_LEVEL):
+    """
+    Routes every log record through a queue to a single background thread that
+    writes to stdout, so logging never blocks the event loop on I/O.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    log_queue = queue.SimpleQueue()
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    root = logging.getLogger()
+    root.handlers = [QueueHandler(log_queue)]
+    root.setLevel(level)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+class Histogram:
+    """Cumulative Prometheus-style buckets plus a window of recent samples for quantiles."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS, window: int = METRICS_WINDOW):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            self.bucket_counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def quantile(self, q: float) -> float:
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """
+    In-process metrics: wall time per (stage, name) span, error counts and LLM
+    token usage. Rendered in the Prometheus text format by `render`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.errors: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.tokens: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.llm_calls: Dict[str, int] = defaultdict(int)
+
+    def reset(self):
+        with self._lock:
+            self.latency.clear()
+            self.errors.clear()
+            self.tokens.clear()
+            self.llm_calls.clear()
+
+    def observe(self, stage: str, name: str, seconds: float, error: bool = False):
+        with self._lock:
+            histogram = self.latency.get((stage, name))
+            if histogram is None:
+                histogram = self.latency[(stage, name)] = Histogram()
+            histogram.observe(seconds)
+            if error:
+                self.errors[(stage, name)] += 1
+
+    def add_tokens(self, call: str, prompt_tokens: int, completion_tokens: int):
+        with self._lock:
+            self.llm_calls[call] += 1
+            self.tokens[(call, "prompt")] += prompt_tokens
+            self.tokens[(call, "completion")] += completion_tokens
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Count and p50/p95/p99 (milliseconds) per "stage/name", for humans and benchmarks."""
+        with self._lock:
+            return {
+                f"{stage}/{name}": {
+                    "count": histogram.count,
+                    **{f"p{int(q * 100)}_ms": round(histogram.quantile(q) * 1000, 1) for q in QUANTILES},
+                }
+                for (stage, name), histogram in sorted(self.latency.items())
+            }
+
+    def render(self) -> str:
+        duration = f"{METRIC_PREFIX}_stage_duration_seconds"
+        latency = f"{METRIC_PREFIX}_stage_latency_seconds"
+        lines = [
+            f"# HELP {duration} Wall time of instrumented stages (graph nodes, tools, LLM, Firestore, Calendar).",
+            f"# TYPE {duration} histogram",
+        ]
+        with self._lock:
+            items = sorted(self.latency.items())
+            for (stage, name), histogram in items:
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.bucket_counts):
+                    cumulative += count
+                    lines.append(f"{duration}_bucket{_labels(stage=stage, name=name, le=bound)} {cumulative}")
+                lines.append(f"{duration}_bucket{_labels(stage=stage, name=name, le='+Inf')} {histogram.count}")
+                lines.append(f"{duration}_sum{_labels(stage=stage, name=name)} {_number(histogram.sum)}")
+                lines.append(f"{duration}_count{_labels(stage=stage, name=name)} {histogram.count}")
+
+            lines.append(f"# HELP {latency} Quantiles of the stage wall time over the most recent {METRICS_WINDOW} samples.")
+            lines.append(f"# TYPE {latency} summary")
+            for (stage, name), histogram in items:
+                for q in QUANTILES:
+                    lines.append(f"{latency}{_labels(stage=stage, name=name, quantile=q)} {_number(histogram.quantile(q))}")
+                lines.append(f"{latency}_sum{_labels(stage=stage, name=name)} {_number(histogram.sum)}")
+                lines.append(f"{latency}_count{_labels(stage=stage, name=name)} {histogram.count}")
+
+            lines.extend(counter_lines(f"{METRIC_PREFIX}_stage_errors_total", "Spans that ended with an exception.",
+                                       ((dict(stage=stage, name=name), count) for (stage, name), count in sorted(self.errors.items()))))
+            lines.extend(counter_lines(f"{METRIC_PREFIX}_llm_calls_total", "Upstream chat model calls.",
+                                       ((dict(call=call), count) for call, count in sorted(self.llm_calls.items()))))
+            lines.extend(counter_lines(f"{METRIC_PREFIX}_llm_tokens_total", "Prompt and completion tokens reported by the model.",
+                                       ((dict(call=call, type=kind), count) for (call, kind), count in sorted(self.tokens.items()))))
+        return "\n".join(lines) + "\n"
+
+
+def counter_lines(name: str, help_text: str, samples: Iterable[Tuple[dict, float]], kind: str = "counter"):
+    """Prometheus text lines for a counter (or gauge) with labelled samples."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    lines.extend(f"{name}{_labels(**labels)} {_number(value)}" for labels, value in samples)
+    return lines
+
+
+metrics = MetricsRegistry()
+
+
+@contextmanager
+def span(stage: str, name: str):
+    """Records the wall time of the enclosed block as a (stage, name) sample."""
+    start = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.observe(stage, name, elapsed, error)
+        logger.debug("span stage=%s name=%s duration_ms=%.1f error=%s", stage, name, elapsed * 1000, error)
+
+
+def traced(stage: str, name: Optional[str] = None):
+    """Decorator wrapping a function (sync or async) in a span named after it by default."""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage, span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage, span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_usage(call: str, message) -> None:
+    """Adds the token usage reported on an AIMessage (if any) to the per-call counters."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    metrics.add_tokens(call, usage.get("input_tokens", 0), usage.get("output_tokens", 0))
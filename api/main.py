@@ -3,8 +3,14 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from api.core.config import ORIGINS
-from api.routes import auth, chat
-from api.services.agent import setup_retriever
+from api.core.telemetry import configure_logging
+from api.routes import admin, auth, chat, health, metrics
+from api.services.calendar_mirror import calendar_mirror
+from api.services.knowledge_base import knowledge_base
+from api.services.warmup import warmup
+from api.services.write_behind import turn_writer
+
+configure_logging()
 
 app = FastAPI(docs_url=None, redoc_url=None)
 
@@ -20,10 +26,22 @@ app.add_middleware(
 # Include routers
 app.include_router(auth.router, prefix="/api")
 app.include_router(chat.router, prefix="/api")
+app.include_router(admin.router, prefix="/api")
+app.include_router(metrics.router)
+app.include_router(health.router)
 
 @app.on_event("startup")
 async def startup_event():
-    setup_retriever()
+    # Loading the graph, clients and index happens in the background; /readyz reports when it is done.
+    warmup.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await warmup.stop()
+    await knowledge_base.stop_watcher()
+    await calendar_mirror.stop_refresher()
+    # Write the chat turns still queued before the process exits.
+    await turn_writer.drain()
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,69 @@
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Security
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+from api.core.config import BATCH_MAX_CONCURRENCY, BATCH_MAX_ITEMS
+from api.core.security import get_admin_api_key
+from api.routes.chat import get_db
+from api.services.batch import BatchRunner
+from api.services.knowledge_base import knowledge_base
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+@router.post("/admin/knowledge/reload")
+async def reload_knowledge(force: bool = False, api_key: str = Security(get_admin_api_key)):
+    """Re-reads the knowledge files and swaps in the new index if they changed (always with `force`)."""
+    logger.info("Knowledge base reload requested (force=%s).", force)
+    try:
+        return await knowledge_base.reload(force=force)
+    except Exception as e:
+        logger.error("Knowledge base reload failed: %s", e)
+        raise HTTPException(status_code=500, detail=f"Knowledge base reload failed: {e}")
+
+@router.get("/admin/knowledge")
+def knowledge_status(api_key: str = Security(get_admin_api_key)):
+    return knowledge_base.status()
+
+
+class BatchItem(BaseModel):
+    message: str
+    session_id: Optional[str] = None
+    id: Optional[str] = None
+
+class BatchRequest(BaseModel):
+    items: List[BatchItem]
+    concurrency: int = Field(BATCH_MAX_CONCURRENCY, ge=1, le=BATCH_MAX_CONCURRENCY)
+    persist: bool = True
+    # `result` lines of an interrupted run: their items are not run again (resume).
+    completed: List[Dict[str, Any]] = []
+
+@router.post("/admin/chatbot/batch")
+async def handle_chat_batch(request: BatchRequest, db=Depends(get_db), api_key: str = Security(get_admin_api_key)):
+    """
+    Runs many chat items through the agent and streams one NDJSON line per item
+    as it finishes, then a `summary` line. Turns of a session run in order;
+    sessions run in parallel. See api/services/batch.py.
+    """
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_ITEMS} items per batch.")
+    if not db:
+        logger.error("Database connection (db) not available.")
+        raise HTTPException(status_code=500, detail="Database service (Firestore) not available.")
+
+    completed = {str(record["id"]): record for record in request.completed
+                 if record.get("status") == "ok" and record.get("id") is not None}
+    runner = BatchRunner(db, concurrency=request.concurrency, persist=request.persist, completed=completed)
+    items = [item.model_dump() for item in request.items]
+    logger.info("Batch of %d items (%d already completed).", len(items), len(completed))
+
+    async def lines():
+        async for record in runner.run(items):
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -1,15 +1,19 @@
 import os
 import json
+import logging
 from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import RedirectResponse
-from google_auth_oauthlib.flow import InstalledAppFlow
 
 from api.core.config import BASE_URL, SCOPES, CREDENTIALS_PATH, TOKEN_PATH
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 def _get_google_auth_flow():
     """Creates a Flow instance for the web authentication flow."""
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
     creds_json_str = os.getenv("GOOGLE_CREDENTIALS_JSON")
     if creds_json_str:
         try:
@@ -28,7 +32,6 @@ def _get_google_auth_flow():
 
 @router.get("/auth/google")
 def auth_google():
-    print("---[API] Initiating authentication flow at /api/auth/google")
     flow = _get_google_auth_flow()
     flow.redirect_uri = f"{BASE_URL}/api/oauth2callback"
     authorization_url, state = flow.authorization_url(
@@ -36,27 +39,23 @@ def auth_google():
         include_granted_scopes='true',
         prompt='consent'  # Forces consent screen and refresh_token
     )
-    print(f"---[API] Redirecting user to: {authorization_url}")
+    logger.info("Redirecting user to the Google consent screen.")
     return RedirectResponse(authorization_url)
 
 @router.get("/oauth2callback")
 def oauth2callback(request: Request):
-    print("---[API] Received callback at /api/oauth2callback")
     flow = _get_google_auth_flow()
     flow.redirect_uri = f"{BASE_URL}/api/oauth2callback"
     try:
-        print("---[API] Attempting to fetch authorization token.")
         flow.fetch_token(authorization_response=str(request.url))
         creds = flow.credentials
-        print("---[API] Token fetched successfully.")
 
         # Save the token to a local file. This file is to get the
         # content that you will then put in the GOOGLE_TOKEN_JSON environment variable.
-        print(f"---[API] Saving credentials to {TOKEN_PATH}")
+        logger.info("Saving calendar credentials to %s", TOKEN_PATH)
         with open(TOKEN_PATH, 'w') as token_file:
             token_file.write(creds.to_json())
-        print("---[API] Credentials saved. Authentication complete.")
         return {"message": "Authentication completed successfully. You can now close this window."}
     except Exception as e:
-        print(f"---[API-ERROR] Error in authentication callback: {e}")
+        logger.error("Error in authentication callback: %s", e)
         raise HTTPException(status_code=500, detail=f"Error in authentication: {e}")
@@ -1,107 +1,140 @@
-import os
 import json
+import time
+import logging
 from typing import Optional
 
 from fastapi import APIRouter, HTTPException, Depends, Security
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
+from api.core.clients import get_firestore
 from api.core.security import get_api_key
+from api.core.telemetry import metrics, traced
 
-from api.services.agent import graph_app, setup_retriever
-import firebase_admin
-from firebase_admin import credentials
-from google.cloud import firestore as google_firestore
+from api.services.answer_cache import answer_cache
+from api.services.conversation import answer, graph_inputs, lookup_cached_answer, maybe_cache_answer, open_session, save_turn
+from api.services.scheduler import Overloaded, chat_scheduler, embedding_scheduler
 
-router = APIRouter()
+logger = logging.getLogger(__name__)
 
-# This is a simplified way to handle the db dependency.
-# In a larger app, you might want to use a more robust dependency injection system.
-db = None
+router = APIRouter()
 
 def get_db():
-    global db
-    if db is None:
-        try:
-            cred_json_str = os.getenv("FIREBASE_SERVICE_ACCOUNT_JSON")
-            if cred_json_str:
-                cred_info = json.loads(cred_json_str)
-                cred = credentials.Certificate(cred_info)
-                
-                if not firebase_admin._apps:
-                    firebase_admin.initialize_app(cred)
-                
-                google_auth_creds = cred.get_credential()
-
-                project_id = firebase_admin.get_app().project_id
-
-                db = google_firestore.Client(project=project_id, database="chatbot-hilos", credentials=google_auth_creds)
-                
-                print("Firebase Admin SDK initialized successfully.")
-            else:
-                print("WARNING: 'FIREBASE_SERVICE_ACCOUNT_JSON' environment variable not set. Chat memory (Firestore) will not work.")
-        except Exception as e:
-            print(f"ERROR: Could not initialize Firebase Admin SDK: {e}")
-    return db
+    """Dependency returning the shared async Firestore client (None if not configured)."""
+    return get_firestore()
 
 
 class ChatRequest(BaseModel):
     message: str
     session_id: Optional[str] = None
 
+def _too_busy(e: Overloaded) -> HTTPException:
+    logger.warning("Shedding request: %s", e)
+    return HTTPException(
+        status_code=429,
+        detail="The assistant is receiving too many requests. Please try again shortly.",
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
 @router.post("/chatbot")
+@traced("request", "chatbot")
 async def handle_chat(request: ChatRequest, db=Depends(get_db), api_key: str = Security(get_api_key)):
-    print("\n---[API] Entering handle_chat ---")
     try:
+        # Reject up front (before touching Firestore) when the model queue is already too long.
+        chat_scheduler.admit()
         if not db:
-            print("---[API-ERROR] Database connection (db) not available.")
+            logger.error("Database connection (db) not available.")
             raise HTTPException(status_code=500, detail="Database service (Firestore) not available.")
 
-        session_id = request.session_id
-        print(f"---[API] Session ID received: {session_id}")
-        chat_history_tuples = []
-
-        if session_id:
-            doc_ref = db.collection("chat_sessions").document(session_id)
-            doc = doc_ref.get()
-            if doc.exists:
-                history_from_db = doc.to_dict().get("history", [])
-                chat_history_tuples = [(item.get("role"), item.get("content")) for item in history_from_db]
-                print(f"---[API] Chat history retrieved for session {session_id}: {len(chat_history_tuples)} turns.")
-            else:
-                print(f"---[API] No history found for session {session_id}.")
-        else:
-            doc_ref = db.collection("chat_sessions").document() # This creates a reference, not the document
-            session_id = doc_ref.id
-            print(f"---[API] New session created with ID: {session_id}")
-
-        inputs = {"question": request.message, "chat_history": chat_history_tuples, "form_data": {}}
-        print(f"---[API] Input for the graph: {{'question': '{request.message}', 'chat_history_length': {len(chat_history_tuples)}}}")
-        
-        result = graph_app.invoke(inputs)
-        
-        generation_data = result.get("generation", {})
+        session_id, session = await open_session(db, request.session_id)
+
+        generation_data = await answer(request.message, session)
         
         reply_text = generation_data.get("reply", "Could not generate a response.")
         form_data = generation_data.get("formData", {})
-        print(f"---[API] Generation received from graph: {reply_text[:80]}...")
-        print(f"---[API] Form data extracted: {form_data}")
-
-        updated_history_tuples = chat_history_tuples + [("user", request.message), ("assistant", reply_text)]
-        history_for_db = [{"role": role, "content": content} for role, content in updated_history_tuples]
+        logger.debug("Generation received from graph: %s... formData: %s", reply_text[:80], form_data)
 
-        print(f"---[API] Saving new history with {len(history_for_db)} turns in session {session_id}.")
-        doc_ref.set({"history": history_for_db}, merge=True)
-        print("---[API] History saved successfully.")
+        form_data, _ = await save_turn(db, session_id, session, request.message, reply_text, form_data)
 
         response_data = {
             "reply": reply_text,
             "session_id": session_id,
             "formData": form_data
         }
-        print(f"---[API] Sending response: {response_data}")
         return response_data
+    except Overloaded as e:
+        raise _too_busy(e)
     except Exception as e:
-        print(f"---[API-CRITICAL-ERROR] An unhandled exception occurred in handle_chat: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("An unhandled exception occurred in handle_chat.")
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {e}")
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.post("/chatbot/stream")
+async def handle_chat_stream(request: ChatRequest, db=Depends(get_db), api_key: str = Security(get_api_key)):
+    """
+    Server-Sent Events variant of /chatbot. Emits `session`, `node`, `tool` and
+    `token` events while the graph runs, then a closing `done` event with the
+    full reply, formData and session_id once the history has been saved.
+    """
+    try:
+        chat_scheduler.admit()
+    except Overloaded as e:
+        raise _too_busy(e)
+    if not db:
+        logger.error("Database connection (db) not available.")
+        raise HTTPException(status_code=500, detail="Database service (Firestore) not available.")
+
+    session_id, session = await open_session(db, request.session_id)
+    inputs = graph_inputs(request.message, session)
+
+    async def event_stream():
+        start = time.perf_counter()
+        yield _sse("session", {"session_id": session_id})
+        try:
+            cached_reply, question_vector = await lookup_cached_answer(request.message, session)
+            if cached_reply is not None:
+                generation_data = {"reply": cached_reply, "formData": {}}
+                yield _sse("token", {"text": cached_reply})
+            else:
+                generation_data = {}
+                # Imported here so the app starts without loading langgraph (api/services/warmup.py preloads it).
+                from api.services.streaming import stream_graph
+                async for event, data in stream_graph(inputs):
+                    if event == "result":
+                        generation_data = data["generation"]
+                        maybe_cache_answer(question_vector, request.message, data)
+                    else:
+                        yield _sse(event, data)
+
+            reply_text = generation_data.get("reply", "Could not generate a response.")
+            form_data = generation_data.get("formData", {})
+            form_data, _ = await save_turn(db, session_id, session, request.message, reply_text, form_data)
+
+            yield _sse("done", {"reply": reply_text, "session_id": session_id, "formData": form_data})
+        except Overloaded as e:
+            logger.warning("Shedding streamed request: %s", e)
+            yield _sse("error", {"detail": "The assistant is receiving too many requests. Please try again shortly.", "retry_after": e.retry_after})
+        except Exception as e:
+            logger.exception("An unhandled exception occurred in handle_chat_stream.")
+            yield _sse("error", {"detail": f"Internal Server Error: {e}"})
+        finally:
+            # The whole stream, from the request until the `done` (or `error`) event.
+            metrics.observe("request", "chatbot_stream", time.perf_counter() - start)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/chatbot/cache/stats")
+def answer_cache_stats(api_key: str = Security(get_api_key)):
+    """Hit-rate metrics of the semantic answer cache, to tune ANSWER_CACHE_THRESHOLD."""
+    return answer_cache.metrics()
+
+@router.get("/chatbot/scheduler/stats")
+def scheduler_stats(api_key: str = Security(get_api_key)):
+    """Queue depth, wait times, shedding, retries and coalescing of the upstream (Gemini) calls."""
+    return {"chat": chat_scheduler.metrics(), "embeddings": embedding_scheduler.metrics()}
@@ -0,0 +1,17 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from api.services.warmup import warmup
+
+router = APIRouter()
+
+@router.get("/healthz")
+def healthz():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "ok"}
+
+@router.get("/readyz")
+def readyz():
+    """Readiness: the graph, model clients, Firestore and the retriever are warm (503 until then)."""
+    status = warmup.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
@@ -0,0 +1,40 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from api.core.telemetry import METRIC_PREFIX, counter_lines, metrics
+from api.services.answer_cache import answer_cache
+from api.services.scheduler import chat_scheduler, embedding_scheduler
+from api.services.write_behind import turn_writer
+
+router = APIRouter()
+
+def _scheduler_lines():
+    schedulers = (chat_scheduler, embedding_scheduler)
+    lines = []
+    lines.extend(counter_lines(f"{METRIC_PREFIX}_upstream_queue_depth", "Callers waiting for an upstream slot.",
+                               ((dict(scheduler=s.name), s.waiting) for s in schedulers), kind="gauge"))
+    lines.extend(counter_lines(f"{METRIC_PREFIX}_upstream_running", "Upstream calls in progress.",
+                               ((dict(scheduler=s.name), s.running) for s in schedulers), kind="gauge"))
+    for stat in ("shed", "retries", "coalesced"):
+        lines.extend(counter_lines(f"{METRIC_PREFIX}_upstream_{stat}_total", f"Upstream calls {stat} by the scheduler.",
+                                   ((dict(scheduler=s.name), s.stats[stat]) for s in schedulers)))
+    return lines
+
+def _answer_cache_lines():
+    return counter_lines(f"{METRIC_PREFIX}_answer_cache_lookups_total", "Semantic answer cache lookups by result.",
+                         ((dict(result=result), answer_cache.stats[key]) for result, key in (("hit", "hits"), ("miss", "misses"))))
+
+def _write_behind_lines():
+    lines = counter_lines(f"{METRIC_PREFIX}_write_behind_pending_writes", "Firestore writes queued by the write-behind layer.",
+                          [({}, turn_writer.pending_writes)], kind="gauge")
+    for stat, help_text in (("commits", "Firestore batch commits"), ("writes", "Firestore document writes"),
+                            ("failed_commits", "Failed Firestore commits"), ("dropped_turns", "Chat turns dropped after the retries")):
+        lines.extend(counter_lines(f"{METRIC_PREFIX}_write_behind_{stat}_total", f"{help_text} of the write-behind layer.",
+                                   [({}, turn_writer.stats[stat])]))
+    return lines
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Prometheus text exposition: per-stage latency histograms and quantiles, token usage, queues and caches."""
+    body = metrics.render() + "\n".join(_scheduler_lines() + _answer_cache_lines() + _write_behind_lines()) + "\n"
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
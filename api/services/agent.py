@@ -1,94 +1,111 @@
-import os
 import json
+import time
+import asyncio
+import logging
 from typing import List, Dict, Any, TypedDict, Optional, Sequence
 
-from langchain_community.document_loaders import UnstructuredMarkdownLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
 from langchain_core.tools import tool
 from langgraph.graph import StateGraph, END
 
-from api.services.calendar import get_calendar_events
+from api.core.clients import get_chat_model
+from api.core.telemetry import metrics, span, traced
+from api.core.config import AGENT_CONTEXT_TOKEN_BUDGET, RESPONDER_CONTEXT_TOKEN_BUDGET, ROUTING_MODE, TOOL_TIMEOUT_SECONDS, SEARCH_CONTEXT_TOKEN_BUDGET
+from api.services.chunking import build_context
+from api.services.calendar import get_calendar_events, check_date_availability
+from api.services.knowledge_base import knowledge_base
+from api.services.prompt_budget import build_context_messages
+from api.services.routing import choose_route
+from api.services.scheduler import invoke_model
 
-# Global variables for the RAG retriever
-vectorstore = None
-retriever = None
+logger = logging.getLogger(__name__)
 
 @tool
-def search_event_info(query: str) -> str:
+async def search_event_info(query: str) -> str:
     """Searches for information about NonaEventos services, prices, and event details."""
-    print(f"---[TOOL] Executing search_event_info with query: {query}")
+    # Read the retriever once: a hot reload may swap in a new one while this search runs.
+    retriever = knowledge_base.retriever or await knowledge_base.ensure_loaded()
     if retriever:
-        relevant_docs = retriever.get_relevant_documents(query)
+        relevant_docs = await retriever.ainvoke(query)
         if relevant_docs:
-            context = "\n\n".join(doc.page_content for doc in relevant_docs)
-            print(f"---[TOOL] RAG context found: {context[:200]}...")
+            context = build_context(relevant_docs, SEARCH_CONTEXT_TOKEN_BUDGET)
+            logger.debug("RAG context found: %s...", context[:200])
             return f"Relevant information found:\n{context}"
     return "No relevant information found."
 
-tools = [get_calendar_events, search_event_info]
+tools = [get_calendar_events, check_date_availability, search_event_info]
+
+def build_model_clients():
+    """Builds the chat model variants the graph nodes use (called by the startup warm-up)."""
+    get_chat_model(temperature=0, tools=tools)  # agent
+    get_chat_model(temperature=0.1)  # responder
+    get_chat_model(temperature=0.1, tools=tools)  # single-call mode
 
 class AgentState(TypedDict):
     question: str
     chat_history: Sequence[tuple]
+    summary: str
+    form_data: Dict[str, Any]
     generation: Any
     tool_calls: List[Dict[str, Any]]
     tool_output: Optional[Dict[str, Any]]
+    route: str
 
 def should_call_tools(state: AgentState) -> str:
     """Determines whether the agent should call a tool."""
-    print("\n---[GRAPH] Node: should_call_tools ---")
     if state.get("tool_calls"):
-        print("---[GRAPH] Decision: YES, tools needed. -> Redirecting to 'tools'")
+        logger.debug("Decision: tools needed -> 'tools'")
         return "tools"
     else:
-        print("---[GRAPH] Decision: NO, tools not needed. -> Redirecting to 'responder'")
+        logger.debug("Decision: no tools needed -> 'responder'")
         return "responder"
 
-def call_model(state: AgentState):
-    print("\n---[GRAPH] Node: agent (call_model) ---")
-    print(f"---[GRAPH] User question: {state['question']}")
-    
-    chat_history = state.get('chat_history', [])
+@traced("node", "agent")
+async def call_model(state: AgentState):
+    logger.debug("Node agent, question: %s", state['question'])
     
     messages = [("system", "You are a virtual assistant for NonaEventos. Respond to user questions in a friendly and helpful manner. You can use the available tools to get information.")]
-    messages.extend(chat_history)
+    messages.extend(build_context_messages(state, AGENT_CONTEXT_TOKEN_BUDGET))
     messages.append(("user", state['question']))
     
-    llm = ChatGoogleGenerativeAI(model="models/gemini-pro-latest", temperature=0).bind_tools(tools)
-    response = llm.invoke(messages)
-    print(f"---[GRAPH] Model response (with tool_calls): {response.tool_calls}")
+    llm = get_chat_model(temperature=0, tools=tools)
+    response = await invoke_model(llm, messages, name="agent")
+    logger.debug("Model response (with tool_calls): %s", response.tool_calls)
     return {"tool_calls": response.tool_calls}
 
-def call_tools(state: AgentState):
-    print("\n---[GRAPH] Node: tools (call_tools) ---")
+async def _run_tool(tool_map, call) -> str:
+    tool_name = call["name"]
+    tool_args = call["args"]
+    logger.debug("Executing tool '%s' with args: %s", tool_name, tool_args)
+    try:
+        with span("tool", tool_name):
+            # wait_for cancels the tool if it does not finish in time.
+            result = await asyncio.wait_for(tool_map[tool_name].ainvoke(tool_args), timeout=TOOL_TIMEOUT_SECONDS)
+        logger.debug("Result of '%s': %s", tool_name, result)
+        return result
+    except asyncio.TimeoutError:
+        logger.warning("Tool '%s' timed out after %ss.", tool_name, TOOL_TIMEOUT_SECONDS)
+        return f"Error executing tool {tool_name}: timed out after {TOOL_TIMEOUT_SECONDS} seconds."
+    except Exception as e:
+        logger.exception("Tool '%s' failed.", tool_name)
+        return f"Error executing tool {tool_name}: {e}"
+
+@traced("node", "tools")
+async def call_tools(state: AgentState):
+    """Runs the requested tool calls concurrently; results keep the order of the calls."""
     tool_map = {tool.name: tool for tool in tools}
+    calls = [call for call in state["tool_calls"] if call["name"] in tool_map]
+    results = await asyncio.gather(*(_run_tool(tool_map, call) for call in calls))
+
     output = {}
-    for call in state["tool_calls"]:
-        tool_name = call["name"]
-        tool_args = call["args"]
-        print(f"---[GRAPH] Executing tool: '{tool_name}' with args: {tool_args}")
-        if tool_name in tool_map:
-            try:
-                output[tool_name] = tool_map[tool_name].invoke(tool_args)
-                print(f"---[GRAPH] Result of '{tool_name}': {output[tool_name]}")
-            except Exception as e:
-                output[tool_name] = f"Error executing tool {tool_name}: {e}"
+    for call, result in zip(calls, results):
+        # Repeated calls to the same tool (e.g. two searches) are combined under its name.
+        if call["name"] in output:
+            output[call["name"]] = f"{output[call['name']]}\n\n{result}"
+        else:
+            output[call["name"]] = result
     return {"tool_output": output}
 
-def generate_final_answer(state: AgentState):
-    print("---GENERATING FINAL ANSWER AND EXTRACTING DATA---")
-    question = state['question']
-    chat_history = state['chat_history']
-    tool_output_dict = state.get('tool_output')
-
-    if tool_output_dict:
-        tool_output_str = "\n".join(f"- {tool}: {output}" for tool, output in tool_output_dict.items())
-    else:
-        tool_output_str = "No tools were used in this turn."
-
-    system_prompt = """You are a virtual assistant for NonaEventos. Your goal is twofold:
+RESPONDER_SYSTEM_PROMPT = """You are a virtual assistant for NonaEventos. Your goal is twofold:
 1.  **Converse politely**: Answer the user's question based on the history and the output of the tools.
 2.  **Extract data**: Fill out a form with the information provided by the user.
 
@@ -103,12 +120,23 @@ def generate_final_answer(state: AgentState):
 Your final answer MUST be a valid JSON code block. The JSON object must have two keys:
 1.  `reply`: (string) Your conversational response to the user.
 2.  `formData`: (JSON object) An object with the fields you have extracted. If a field is not yet known, do not include it or leave it as null.
+Fields listed under "Form data already collected" are known: leave them out of `formData` unless the user corrects them in this message.
 """
 
+SINGLE_CALL_INSTRUCTIONS = """
+**Tools:** If answering requires information about NonaEventos services and prices, or about calendar availability, call the appropriate tool instead of answering. Otherwise answer directly in the required JSON format."""
+
+def _responder_messages(state: AgentState, system_prompt: str = RESPONDER_SYSTEM_PROMPT):
+    question = state['question']
+    tool_output_dict = state.get('tool_output')
+
+    if tool_output_dict:
+        tool_output_str = "\n".join(f"- {tool}: {output}" for tool, output in tool_output_dict.items())
+    else:
+        tool_output_str = "No tools were used in this turn."
+
     messages = [("system", system_prompt)]
-    
-    if chat_history:
-        messages.extend(chat_history)
+    messages.extend(build_context_messages(state, RESPONDER_CONTEXT_TOKEN_BUDGET))
         
     if tool_output_dict:
         tool_output_message = f"Tools used:\n{tool_output_str}"
@@ -117,46 +145,78 @@ Your final answer MUST be a valid JSON code block. The JSON object must have two
     messages.append(("user", question))
     
     messages.append(("system", "**Your Answer (only the JSON code block):**"))
+    return messages
 
-    llm = ChatGoogleGenerativeAI(model="models/gemini-pro-latest", temperature=0.1)
-    
-    response = llm.invoke(messages)
-    raw_response = response.content if response.content else ""
-
-    safe_raw_response = raw_response.encode('utf-8', 'ignore').decode('utf-8')
-    print(f"---[GRAPH] RAW model response: {safe_raw_response}")
+def _parse_generation(raw_response: str) -> Dict[str, Any]:
+    logger.debug("RAW model response: %s", raw_response)
 
     try:
         json_block = raw_response.strip().replace("```json", "").replace("```", "").strip()
         if not json_block:
-            return {"generation": {"reply": "I could not process your request. Could you try again?", "formData": {}}}
+            return {"reply": "I could not process your request. Could you try again?", "formData": {}}
         parsed_json = json.loads(json_block)
-        print("---[GRAPH] JSON parsed successfully.")
-        return {"generation": parsed_json}
+        return parsed_json
     except Exception as e:
-        print(f"---[GRAPH-ERROR] Could not parse JSON from AI response: {e}")
-        return {"generation": {"reply": raw_response, "formData": {}}}
-
-def setup_retriever():
-    global vectorstore, retriever
-    doc_path = os.path.join(os.path.dirname(__file__), '..', '..', 'docs', 'info_eventos.md')
-    if not os.path.exists(doc_path):
-        raise FileNotFoundError(f"Knowledge file not found at: {doc_path}")
-    loader = UnstructuredMarkdownLoader(doc_path)
-    docs = loader.load()
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    splits = text_splitter.split_documents(docs)
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-    vectorstore = FAISS.from_documents(splits, embeddings)
-    retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
-    print("Retriever configured and ready.")
+        logger.warning("Could not parse JSON from AI response: %s", e)
+        return {"reply": raw_response, "formData": {}}
+
+@traced("node", "responder")
+async def generate_final_answer(state: AgentState):
+    messages = _responder_messages(state)
+
+    llm = get_chat_model(temperature=0.1)
+    
+    response = await invoke_model(llm, messages, name="responder")
+    raw_response = response.content if response.content else ""
+    return {"generation": _parse_generation(raw_response)}
+
+@traced("node", "single")
+async def call_model_with_answer(state: AgentState):
+    """Single-call mode: one tool-enabled call that either requests tools or returns the final JSON."""
+    messages = _responder_messages(state, RESPONDER_SYSTEM_PROMPT + SINGLE_CALL_INSTRUCTIONS)
+
+    llm = get_chat_model(temperature=0.1, tools=tools)
+    response = await invoke_model(llm, messages, name="single")
+    if response.tool_calls:
+        logger.debug("Model response (with tool_calls): %s", response.tool_calls)
+        return {"tool_calls": response.tool_calls}
+    raw_response = response.content if response.content else ""
+    return {"tool_calls": [], "generation": _parse_generation(raw_response)}
+
+@traced("node", "route")
+def route_question(state: AgentState):
+    route = choose_route(state["question"], state.get("chat_history", ()))
+    logger.debug("Node route -> '%s' (mode: %s)", route, ROUTING_MODE)
+    return {"route": route}
+
+def after_single_call(state: AgentState) -> str:
+    return "tools" if state.get("tool_calls") else END
+
+async def run_graph(inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """Runs the graph and records its latency under the path the turn took."""
+    start = time.perf_counter()
+    result = await graph_app.ainvoke(inputs)
+    path = result.get("route", "agent") + ("+tools" if result.get("tool_output") else "")
+    metrics.observe("graph", path, time.perf_counter() - start)
+    return result
 
 workflow = StateGraph(AgentState)
+workflow.add_node("route", route_question)
 workflow.add_node("agent", call_model)
+workflow.add_node("single", call_model_with_answer)
 workflow.add_node("tools", call_tools)
 workflow.add_node("responder", generate_final_answer)
 
-workflow.set_entry_point("agent")
+workflow.set_entry_point("route")
+workflow.add_conditional_edges(
+    "route",
+    lambda state: state["route"],
+    {
+        "agent": "agent",
+        "single": "single",
+        "responder": "responder",
+    }
+)
 workflow.add_conditional_edges(
     "agent",
     should_call_tools,
@@ -165,6 +225,14 @@ workflow.add_conditional_edges(
         "responder": "responder",
     }
 )
+workflow.add_conditional_edges(
+    "single",
+    after_single_call,
+    {
+        "tools": "tools",
+        END: END,
+    }
+)
 workflow.add_edge("tools", "responder")
 workflow.add_edge("responder", END)
 graph_app = workflow.compile()
@@ -0,0 +1,147 @@
+import re
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from api.core.clients import get_embeddings
+from api.core.config import (
+    ANSWER_CACHE_ENABLED,
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_THRESHOLD,
+    ANSWER_CACHE_TTL_SECONDS,
+)
+from api.services.form_extraction import extract_form_fields
+from api.services.scheduler import embed_query
+
+logger = logging.getLogger(__name__)
+
+# Tools whose output depends on the moment of the question; replies built from them are never cached.
+TIME_DEPENDENT_TOOLS = {"get_calendar_events", "check_date_availability"}
+# Questions that carry personal data (emails, phone numbers) get a personalised reply.
+_PERSONAL_DATA = re.compile(r"@|\d[\d\s().-]{5,}\d")
+# formData fields about the customer. `message` and `eventType` only restate the question, so the
+# model fills them in for plain FAQ questions too; they do not make a reply personal.
+PERSONAL_FIELDS = ("name", "email", "phone")
+
+
+class SemanticAnswerCache:
+    """
+    Cache of replies keyed by the embedding of the question. A lookup returns the
+    reply of the most similar cached question if its cosine similarity reaches
+    `threshold`. Entries expire after `ttl` seconds and the least recently used
+    ones are evicted beyond `max_entries`. The whole cache is dropped when the
+    knowledge base version changes.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, ttl: float = ANSWER_CACHE_TTL_SECONDS,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.knowledge_version: Optional[str] = None
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_ids = []
+        self._next_id = 0
+        self.stats = {"lookups": 0, "hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def set_knowledge_version(self, version: str):
+        """Clears the cache if the knowledge base changed since the entries were stored."""
+        if version != self.knowledge_version:
+            if self._entries:
+                self.stats["invalidations"] += 1
+                logger.info("Knowledge base changed (%s -> %s). Clearing %d cached answers.",
+                            self.knowledge_version, version, len(self._entries))
+            self.clear()
+            self.knowledge_version = version
+
+    def clear(self):
+        self._entries.clear()
+        self._matrix = None
+
+    async def embed(self, question: str) -> np.ndarray:
+        vector = np.asarray(await embed_query(get_embeddings(), question, name="answer_cache"), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _vectors(self):
+        if self._matrix is None and self._entries:
+            self._matrix_ids = list(self._entries.keys())
+            self._matrix = np.stack([self._entries[entry_id]["vector"] for entry_id in self._matrix_ids])
+        return self._matrix
+
+    def _expire(self):
+        now = time.monotonic()
+        expired = [entry_id for entry_id, entry in self._entries.items() if now - entry["created_at"] > self.ttl]
+        for entry_id in expired:
+            del self._entries[entry_id]
+        if expired:
+            self.stats["expirations"] += len(expired)
+            self._matrix = None
+
+    def lookup(self, vector: np.ndarray) -> Optional[Dict[str, Any]]:
+        """Returns the cached entry most similar to `vector`, or None below the threshold."""
+        self.stats["lookups"] += 1
+        self._expire()
+        matrix = self._vectors()
+        if matrix is not None:
+            similarities = matrix @ vector
+            best = int(np.argmax(similarities))
+            score = float(similarities[best])
+            if score >= self.threshold:
+                entry_id = self._matrix_ids[best]
+                self._entries.move_to_end(entry_id)
+                self.stats["hits"] += 1
+                logger.debug("Answer cache hit (similarity %.3f) for cached question: %s", score, self._entries[entry_id]["question"][:80])
+                return {**self._entries[entry_id], "similarity": score}
+        self.stats["misses"] += 1
+        return None
+
+    def store(self, vector: np.ndarray, question: str, reply: str):
+        self._entries[self._next_id] = {"question": question, "reply": reply, "vector": vector, "created_at": time.monotonic()}
+        self._next_id += 1
+        self.stats["stores"] += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+        self._matrix = None
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.stats["lookups"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+            "threshold": self.threshold,
+            "knowledge_version": self.knowledge_version,
+        }
+
+
+def is_eligible(message: str, session: Dict[str, Any]) -> bool:
+    """Only first-turn questions without personal data can be answered from the cache."""
+    if not ANSWER_CACHE_ENABLED:
+        return False
+    if session.get("history") or session.get("summary") or session.get("form_data"):
+        return False
+    if _PERSONAL_DATA.search(message):
+        return False
+    # A name ("Me llamo Lucía...") is handed to the model as already collected, so it never shows
+    # up in the reply's formData; the reply can still be personalised with it.
+    fields = extract_form_fields(message)
+    return not any(fields.get(field) for field in PERSONAL_FIELDS)
+
+
+def is_cacheable(result: Dict[str, Any]) -> bool:
+    """A reply is reusable if it extracted no personal data and did not depend on the calendar."""
+    generation = result.get("generation") or {}
+    form_data = generation.get("formData") or {}
+    if not generation.get("reply") or any(form_data.get(field) for field in PERSONAL_FIELDS):
+        return False
+    used_tools = set((result.get("tool_output") or {}).keys())
+    return not (used_tools & TIME_DEPENDENT_TOOLS)
+
+
+answer_cache = SemanticAnswerCache()
@@ -0,0 +1,269 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+from collections import Counter, OrderedDict
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+
+from api.core.clients import get_firestore
+from api.core.config import BATCH_ITEM_RETRIES, BATCH_MAX_CONCURRENCY, HISTORY_WINDOW
+from api.core.telemetry import configure_logging, metrics
+from api.services.conversation import answer, empty_session, open_session, save_turn, turn_form_data
+from api.services.history import all_turns, new_session_id, session_ids
+from api.services.knowledge_base import knowledge_base
+from api.services.prompt_budget import refresh_summary
+from api.services.scheduler import Overloaded
+
+logger = logging.getLogger(__name__)
+
+
+def _advance(session: Dict[str, Any], message: str, reply: str, form_data: Dict[str, Any],
+             next_seq: Optional[int] = None) -> Dict[str, Any]:
+    """The session state after a turn, as the next turn of the batch must see it (a new dict)."""
+    history = list(session["history"]) + [("user", message), ("assistant", reply)]
+    first_seq = session["first_seq"]
+    if len(history) > HISTORY_WINDOW:
+        first_seq += len(history) - HISTORY_WINDOW
+        history = history[-HISTORY_WINDOW:]
+    return {**session, "history": history, "first_seq": first_seq,
+            "next_seq": session["next_seq"] + 2 if next_seq is None else next_seq, "form_data": form_data}
+
+
+def _apply_summary(session: Dict[str, Any], summary: str, summary_upto: int) -> Dict[str, Any]:
+    """The session state once the turns before `summary_upto` are folded into `summary`."""
+    dropped = max(0, min(summary_upto - session["first_seq"], len(session["history"])))
+    return {**session, "summary": summary, "summary_upto": summary_upto,
+            "history": session["history"][dropped:], "first_seq": session["first_seq"] + dropped}
+
+
+class BatchRunner:
+    """
+    Runs many (session_id, message) items through the chat graph.
+
+    - Items of the same session run one after another, in input order, each
+      seeing the turns before it. Different sessions run in parallel, at most
+      `concurrency` at a time (the model calls are further limited by the
+      upstream scheduler).
+    - Items without a session_id each start a new session.
+    - With `persist` the turns of each item are written to Firestore (not
+      through the write-behind queue) before the item is reported "ok", so a
+      resumed run never skips an item whose turns were lost; without it the
+      batch is a dry run over the current session state. `start_empty` ignores
+      the stored state (used to replay stored conversations from scratch).
+    - The summary is refreshed after each item, before the next one of the
+      session runs, so later items see it (and it is stored with `persist`).
+    - Results are yielded as soon as each item finishes. An item that fails
+      makes the rest of its session "skipped".
+    - `completed` maps item ids to results of an earlier run (status "ok"),
+      which are not run again; their reply is fed into the session state, so a
+      resumed run continues exactly where the previous one stopped.
+    """
+
+    def __init__(self, db, concurrency: int = BATCH_MAX_CONCURRENCY, persist: bool = True,
+                 start_empty: bool = False, completed: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.db = db
+        self.concurrency = max(1, concurrency)
+        self.persist = persist
+        self.start_empty = start_empty
+        self.completed = completed or {}
+
+    @staticmethod
+    def group_by_session(items: Iterable[Dict[str, Any]]) -> "OrderedDict[str, List[Dict[str, Any]]]":
+        sessions: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        for index, item in enumerate(items):
+            item = {**item, "id": str(index if item.get("id") is None else item["id"])}
+            key = item.get("session_id") or f"new:{item['id']}"
+            sessions.setdefault(key, []).append(item)
+        return sessions
+
+    async def _answer(self, message: str, session: Dict[str, Any]) -> Dict[str, Any]:
+        for attempt in range(BATCH_ITEM_RETRIES + 1):
+            try:
+                return await answer(message, session)
+            except Overloaded as e:
+                # Batches are not interactive: wait for capacity instead of failing the item.
+                if attempt == BATCH_ITEM_RETRIES:
+                    raise
+                await asyncio.sleep(e.retry_after)
+
+    async def _summarize(self, session_id: str, before: Dict[str, Any], after: Dict[str, Any],
+                         new_turns: List[tuple]) -> Dict[str, Any]:
+        # Awaited one item at a time (the chat routes run it in the background), so the next item of
+        # the session sees the new summary and never folds the same turns again.
+        try:
+            folded = await refresh_summary(self.db, session_id, before, new_turns, save=self.persist)
+        except Exception as e:
+            logger.error("Could not update summary for session %s: %s", session_id, e)
+            return after
+        return _apply_summary(after, *folded) if folded else after
+
+    async def _run_session(self, session_id: Optional[str], items: List[Dict[str, Any]],
+                           semaphore: asyncio.Semaphore, emit):
+        async with semaphore:
+            try:
+                if self.start_empty:
+                    session_id, session = session_id or new_session_id(self.db), empty_session()
+                else:
+                    session_id, session = await open_session(self.db, session_id)
+            except Exception as e:
+                logger.error("Batch: could not load session %s: %s", session_id, e)
+                for item in items:
+                    await emit({"type": "result", "id": item["id"], "session_id": session_id,
+                                "status": "error", "error": f"Could not load session: {e}"})
+                return
+
+            failed = False
+            for item in items:
+                message = item["message"]
+                previous = self.completed.get(item["id"])
+                if previous is not None:
+                    if not self.persist:
+                        # Persisted turns are already in the loaded session; dry runs replay the earlier result.
+                        session = _advance(session, message, previous.get("reply", ""),
+                                           turn_form_data(session, message, previous.get("formData")))
+                    continue
+                if failed:
+                    await emit({"type": "result", "id": item["id"], "session_id": session_id, "status": "skipped"})
+                    continue
+
+                start = time.perf_counter()
+                try:
+                    generation = await self._answer(message, session)
+                    reply = generation.get("reply", "Could not generate a response.")
+                    next_seq = None
+                    if self.persist:
+                        form_data, next_seq = await save_turn(self.db, session_id, session, message, reply,
+                                                              generation.get("formData"), durable=True)
+                    else:
+                        form_data = turn_form_data(session, message, generation.get("formData"))
+                    session = await self._summarize(session_id, session,
+                                                    _advance(session, message, reply, form_data, next_seq),
+                                                    [("user", message), ("assistant", reply)])
+                    result = {"status": "ok", "reply": reply, "formData": form_data}
+                except Exception as e:
+                    logger.error("Batch item %s (session %s) failed: %s", item["id"], session_id, e)
+                    failed = True
+                    result = {"status": "error", "error": str(e)}
+                elapsed = time.perf_counter() - start
+                metrics.observe("batch", "item", elapsed, failed)
+                await emit({"type": "result", "id": item["id"], "session_id": session_id, **result,
+                            "duration_ms": round(elapsed * 1000)})
+
+    async def run(self, items: Iterable[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+        """Yields one `result` record per item not already completed, then a `summary` record."""
+        sessions = self.group_by_session(items)
+        queue: asyncio.Queue = asyncio.Queue()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        counts = Counter()
+        start = time.perf_counter()
+
+        async def runner():
+            try:
+                await asyncio.gather(*(
+                    self._run_session(None if key.startswith("new:") else key, session_items, semaphore, queue.put)
+                    for key, session_items in sessions.items()
+                ))
+            finally:
+                await queue.put(None)
+
+        task = asyncio.create_task(runner())
+        try:
+            while (record := await queue.get()) is not None:
+                counts[record["status"]] += 1
+                yield record
+            await task
+        finally:
+            # The consumer went away (e.g. the HTTP client disconnected): stop the remaining work.
+            task.cancel()
+
+        yield {
+            "type": "summary",
+            "sessions": len(sessions),
+            "items": sum(len(session_items) for session_items in sessions.values()),
+            "resumed": sum(1 for session_items in sessions.values() for item in session_items if item["id"] in self.completed),
+            **{status: counts[status] for status in ("ok", "error", "skipped")},
+            "duration_ms": round((time.perf_counter() - start) * 1000),
+        }
+
+
+def read_items(path: str) -> List[Dict[str, Any]]:
+    """Items from a JSON array or an NDJSON file of {"id"?, "session_id"?, "message"} objects."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def read_completed(path: str) -> Dict[str, Dict[str, Any]]:
+    """Successful results already written to an NDJSON output file, by item id."""
+    completed = {}
+    if not os.path.exists(path):
+        return completed
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # A line cut short by an interrupted run
+            if record.get("type") == "result" and record.get("status") == "ok":
+                completed[str(record["id"])] = record
+    return completed
+
+
+async def replay_items(db, only: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """The user messages of stored sessions, in order, as batch items (for re-running conversations)."""
+    items = []
+    for session_id in only or await session_ids(db):
+        for turn in await all_turns(db, session_id):
+            if turn.get("role") == "user":
+                items.append({"id": f"{session_id}:{turn['seq']}", "session_id": session_id, "message": turn.get("content", "")})
+    return items
+
+
+async def _run_cli(args) -> int:
+    db = get_firestore()
+    if not db:
+        print("Firestore is not configured (FIREBASE_SERVICE_ACCOUNT_JSON).")
+        return 1
+    replay = args.replay_sessions or bool(args.session)
+    items = await replay_items(db, args.session) if replay else read_items(args.input)
+    completed = read_completed(args.output) if args.output else {}
+    runner = BatchRunner(db, concurrency=args.concurrency, persist=args.persist and not replay,
+                         start_empty=replay, completed=completed)
+    await knowledge_base.ensure_loaded()
+
+    out = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    try:
+        async for record in runner.run(items):
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()  # Every finished item is on disk, so an interrupted run can be resumed.
+            if record["type"] == "summary" and out is not sys.stdout:
+                print(json.dumps(record))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0 if record["type"] == "summary" and not record["error"] else 1
+
+
+def main(argv=None) -> int:
+    """Runs a batch of chat items (or replays stored sessions) through the graph, writing NDJSON results."""
+    parser = argparse.ArgumentParser(description="Run many chat messages through the NonaEventos agent.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help='JSON array or NDJSON file of {"id", "session_id", "message"} items.')
+    source.add_argument("--replay-sessions", action="store_true",
+                        help="Replay the user messages of every stored session from an empty state (never persisted).")
+    source.add_argument("--session", action="append", help="Replay only this stored session (repeatable).")
+    parser.add_argument("--output", help="NDJSON results file. Appended to; successful items already in it are skipped (resume).")
+    parser.add_argument("--concurrency", type=int, default=BATCH_MAX_CONCURRENCY, help="Sessions processed in parallel.")
+    parser.add_argument("--no-persist", dest="persist", action="store_false", help="Do not save the turns (dry run).")
+    args = parser.parse_args(argv)
+    configure_logging()
+    return asyncio.run(_run_cli(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
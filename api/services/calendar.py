@@ -1,106 +1,68 @@
-import os
-import json
+import logging
 import datetime
-from typing import Optional
 
-from google.auth.transport.requests import Request as GoogleRequest
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from langchain_core.tools import tool
 
-from api.core.config import SCOPES, TOKEN_PATH
+from api.services.calendar_mirror import calendar_mirror, CalendarAuthError
 
-def _get_calendar_credentials() -> Optional[Credentials]:
-    """
-    Loads Google Calendar credentials from an environment variable or a local file.
-    For production (Vercel), the GOOGLE_TOKEN_JSON environment variable should be used.
-    """
-    creds = None
-    print("---[AUTH] Starting to fetch calendar credentials.")
-    token_json_str = os.getenv("GOOGLE_TOKEN_JSON")
+logger = logging.getLogger(__name__)
 
-    if token_json_str:
-        # Load from environment variable (ideal for Vercel)
-        try:
-            token_info = json.loads(token_json_str)
-            creds = Credentials.from_authorized_user_info(token_info, SCOPES)
-            print("---[AUTH] Credentials loaded from GOOGLE_TOKEN_JSON environment variable.")
-        except json.JSONDecodeError:
-            print("---[AUTH-ERROR] The GOOGLE_TOKEN_JSON environment variable is not valid JSON.")
-            return None
-    elif os.path.exists(TOKEN_PATH):
-        # Load from local file (for development or first-time authentication)
-        print(f"---[AUTH] Attempting to load credentials from local file: {TOKEN_PATH}")
-        creds = Credentials.from_authorized_user_file(TOKEN_PATH, SCOPES)
-        print("---[AUTH] Credentials loaded from local file.")
+NOT_AUTHENTICATED = "Error: The user is not authenticated. Please authorize access to your calendar."
+
+
+def _format_events(events) -> str:
+    event_list = []
+    for event in events:
+        start = event["start"].get("dateTime", event["start"].get("date"))
+        event_list.append(f"- {event.get('summary', 'Busy')} (Start: {start})")
+    return "\n".join(event_list)
 
-    # If credentials don't exist or are not valid, try to refresh them
-    if not creds or not creds.valid:
-        print("---[AUTH] Credentials not found or not valid.")
-        if creds and creds.expired and creds.refresh_token:
-            print("---[AUTH] Credentials expired. Attempting to refresh token...")
-            try:
-                creds.refresh(GoogleRequest())
-                print("---[AUTH] Token refreshed successfully.")
-                # IMPORTANT: If the token is refreshed, the new state will not be saved
-                # to the environment variable automatically. The `refresh_token` is still
-                # valid, so it will work on the next execution.
-            except Exception as e:
-                print(f"Error refreshing token: {e}")
-                return None
-        else:
-            print("---[AUTH-ERROR] No valid credentials or refresh_token. Manual authentication required.")
-            # No credentials or refresh token, authentication is needed.
-            return None
-    
-    print("---[AUTH] Valid credentials obtained.")
-    return creds
 
 @tool
-def get_calendar_events(days_from_now: int) -> str:
+async def get_calendar_events(days_from_now: int) -> str:
     """Searches Google Calendar for events in the next 'days_from_now' days."""
-    print(f"---[TOOL] Executing get_calendar_events for the next {days_from_now} days.")
-    creds = _get_calendar_credentials()
-    if not creds:
-        print("---[TOOL-ERROR] Could not get credentials for get_calendar_events.")
-        return "Error: The user is not authenticated. Please authorize access to your calendar."
-    
     try:
-        service = build("calendar", "v3", credentials=creds)
-        now = datetime.datetime.now(datetime.timezone.utc).isoformat()
-        future_date = (datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=days_from_now)).isoformat()
-        
-        print(f"---[TOOL] Searching for events between {now} and {future_date}")
-        events_result = (
-            service.events()
-            .list(
-                calendarId="primary",
-                timeMin=now,
-                timeMax=future_date,
-                maxResults=10,
-                singleEvents=True,
-                orderBy="startTime",
-            )
-            .execute()
-        )
-        events = events_result.get("items", [])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        future_date = now + datetime.timedelta(days=days_from_now)
+        logger.debug("get_calendar_events between %s and %s", now.isoformat(), future_date.isoformat())
+        events = await calendar_mirror.events_between(now, future_date)
 
         if not events:
-            print(f"---[TOOL] No events found.")
             return f"No events found in the next {days_from_now} days."
 
-        print(f"---[TOOL] Found {len(events)} events.")
-        event_list = []
-        for event in events:
-            start = event["start"].get("dateTime", event["start"].get("date"))
-            event_list.append(f"- {event['summary']} (Start: {start})")
-        response = "Found events:\n" + "\n".join(event_list)
-        print(f"---[TOOL] Tool response: {response}")
-        return response
+        logger.debug("get_calendar_events found %d events.", len(events))
+        return "Found events:\n" + _format_events(events)
+
+    except CalendarAuthError:
+        logger.warning("No Google Calendar credentials for get_calendar_events.")
+        return NOT_AUTHENTICATED
+    except HttpError as error:
+        logger.error("Google Calendar API error: %s", error)
+        return f"An error occurred with the Google Calendar API: {error}"
+    except Exception as e:
+        logger.exception("Unexpected calendar tool error.")
+        return f"An unexpected error occurred: {e}"
 
+
+@tool
+async def check_date_availability(date: str) -> str:
+    """Checks in Google Calendar whether a given date (format YYYY-MM-DD) is free or already booked."""
+    try:
+        day = datetime.date.fromisoformat(date)
+    except ValueError:
+        return f"Invalid date '{date}'. Use the format YYYY-MM-DD."
+    try:
+        events = await calendar_mirror.events_on(day)
+        if not events:
+            return f"The date {date} is free."
+        return f"The date {date} is already booked ({len(events)} events):\n" + _format_events(events)
+    except CalendarAuthError:
+        logger.warning("No Google Calendar credentials for check_date_availability.")
+        return NOT_AUTHENTICATED
     except HttpError as error:
-        print(f"---[TOOL-ERROR] HttpError with Google Calendar API: {error}")
+        logger.error("Google Calendar API error: %s", error)
         return f"An error occurred with the Google Calendar API: {error}"
     except Exception as e:
-        return f"An unexpected error occurred: {e}"
\ No newline at end of file
+        logger.exception("Unexpected calendar tool error.")
+        return f"An unexpected error occurred: {e}"
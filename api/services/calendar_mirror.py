@@ -0,0 +1,215 @@
+import time
+import bisect
+import logging
+import asyncio
+import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from googleapiclient.errors import HttpError
+
+from api.core.clients import get_calendar_service
+from api.core.config import CALENDAR_MAX_STALENESS_SECONDS, CALENDAR_SYNC_INTERVAL_SECONDS, CALENDAR_TIMEZONE
+from api.core.telemetry import span
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 2500  # Maximum page size allowed by events().list
+AUTH_RETRY_SECONDS = 300  # Background syncs without credentials are retried this rarely
+
+
+class CalendarAuthError(Exception):
+    """Raised when there are no valid Google Calendar credentials."""
+
+
+class IntervalIndex:
+    """
+    Immutable index of (start, end, event) intervals sorted by start. Overlap
+    queries bisect on the start times and only scan back as far as the longest
+    interval in the index.
+    """
+
+    def __init__(self, intervals: List[Tuple[datetime.datetime, datetime.datetime, Dict[str, Any]]]):
+        self._items = sorted(intervals, key=lambda item: item[0])
+        self._starts = [item[0] for item in self._items]
+        self._max_duration = max((end - start for start, end, _ in self._items), default=datetime.timedelta(0))
+
+    def __len__(self):
+        return len(self._items)
+
+    def overlapping(self, start: datetime.datetime, end: datetime.datetime) -> List[Dict[str, Any]]:
+        """Returns the events that overlap [start, end), ordered by start time."""
+        hi = bisect.bisect_left(self._starts, end)
+        lo = bisect.bisect_left(self._starts, start - self._max_duration)
+        return [event for item_start, item_end, event in self._items[lo:hi] if item_end > start]
+
+
+def _event_bounds(event: Dict[str, Any], tz: datetime.tzinfo) -> Optional[Tuple[datetime.datetime, datetime.datetime]]:
+    start, end = event.get("start", {}), event.get("end", {})
+    if "dateTime" in start:
+        start_dt = datetime.datetime.fromisoformat(start["dateTime"])
+        end_dt = datetime.datetime.fromisoformat(end.get("dateTime", start["dateTime"]))
+    elif "date" in start:
+        # All-day events: the end date is exclusive.
+        start_dt = datetime.datetime.combine(datetime.date.fromisoformat(start["date"]), datetime.time.min, tzinfo=tz)
+        end_date = end.get("date")
+        end_dt = (
+            datetime.datetime.combine(datetime.date.fromisoformat(end_date), datetime.time.min, tzinfo=tz)
+            if end_date else start_dt + datetime.timedelta(days=1)
+        )
+    else:
+        return None
+    if start_dt.tzinfo is None:
+        start_dt = start_dt.replace(tzinfo=tz)
+    if end_dt.tzinfo is None:
+        end_dt = end_dt.replace(tzinfo=tz)
+    return start_dt, end_dt
+
+
+class CalendarMirror:
+    """
+    In-memory mirror of a Google Calendar. The first sync pages through every
+    event; later syncs only fetch the changes since the stored sync token.
+    Queries are answered from an interval index and trigger a sync only when the
+    mirror is older than `max_staleness` seconds. Concurrent queries on a stale
+    mirror share a single sync. The refresher task (started with the warm-up)
+    runs the first sync in the background and then syncs every `sync_interval`
+    seconds, so with traffic or without it queries find the mirror fresh.
+    """
+
+    def __init__(self, calendar_id: str = "primary", max_staleness: float = CALENDAR_MAX_STALENESS_SECONDS,
+                 timezone: str = CALENDAR_TIMEZONE, sync_interval: float = CALENDAR_SYNC_INTERVAL_SECONDS):
+        self.calendar_id = calendar_id
+        self.max_staleness = max_staleness
+        self.sync_interval = sync_interval
+        self.tz = ZoneInfo(timezone)
+        self._events: Dict[str, Dict[str, Any]] = {}
+        self._index = IntervalIndex([])
+        self._sync_token: Optional[str] = None
+        self._last_sync: Optional[float] = None
+        self._sync_task: Optional[asyncio.Task] = None
+        self._refresher: Optional[asyncio.Task] = None
+
+    @property
+    def is_fresh(self) -> bool:
+        return self._last_sync is not None and time.monotonic() - self._last_sync <= self.max_staleness
+
+    def _list_all(self, service, sync_token: Optional[str]):
+        """Pages through events().list. Blocking: runs in a worker thread."""
+        items = []
+        page_token = None
+        while True:
+            params = {"calendarId": self.calendar_id, "singleEvents": True, "maxResults": PAGE_SIZE}
+            if sync_token:
+                params["syncToken"] = sync_token
+            if page_token:
+                params["pageToken"] = page_token
+            result = service.events().list(**params).execute()
+            items.extend(result.get("items", []))
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                return items, result.get("nextSyncToken")
+
+    def _fetch_changes(self, sync_token: Optional[str]):
+        """Returns (items, next_sync_token, is_full_sync). Blocking: runs in a worker thread."""
+        service = get_calendar_service()
+        if not service:
+            raise CalendarAuthError("No valid Google Calendar credentials.")
+        if sync_token:
+            try:
+                items, next_token = self._list_all(service, sync_token)
+                return items, next_token, False
+            except HttpError as error:
+                # 410 Gone: the sync token expired, a full sync is required.
+                if getattr(error.resp, "status", None) != 410:
+                    raise
+                logger.info("Calendar sync token expired. Performing a full sync.")
+        items, next_token = self._list_all(service, None)
+        return items, next_token, True
+
+    def _apply(self, items: List[Dict[str, Any]], sync_token: Optional[str], full: bool):
+        events = {} if full else dict(self._events)
+        for event in items:
+            if event.get("status") == "cancelled":
+                events.pop(event.get("id"), None)
+            else:
+                events[event["id"]] = event
+
+        intervals = []
+        for event in events.values():
+            bounds = _event_bounds(event, self.tz)
+            if bounds:
+                intervals.append((bounds[0], bounds[1], event))
+
+        # Swap the new state in one go so readers never see a partially applied sync.
+        self._events, self._index = events, IntervalIndex(intervals)
+        self._sync_token = sync_token
+        self._last_sync = time.monotonic()
+        logger.info("%s calendar sync applied: %d changes, %d events mirrored.",
+                    "Full" if full else "Incremental", len(items), len(self._index))
+
+    async def _sync(self):
+        with span("calendar", "sync"):
+            items, sync_token, full = await asyncio.to_thread(self._fetch_changes, self._sync_token)
+        self._apply(items, sync_token, full)
+
+    async def sync(self):
+        """Syncs the mirror now, sharing the sync with concurrent callers."""
+        if self._sync_task is None:
+            self._sync_task = asyncio.ensure_future(self._sync())
+            self._sync_task.add_done_callback(self._clear_sync_task)
+        # Shield the shared sync so a cancelled caller does not cancel it for everyone else.
+        await asyncio.shield(self._sync_task)
+
+    async def ensure_fresh(self):
+        """Syncs the mirror if it is older than the staleness bound."""
+        if not self.is_fresh:
+            await self.sync()
+
+    def _clear_sync_task(self, task: asyncio.Task):
+        if self._sync_task is task:
+            self._sync_task = None
+        if not task.cancelled():
+            task.exception()  # Mark the exception as retrieved; awaiting callers already received it.
+
+    async def _refresh(self):
+        # The first pass is the full sync, so the first availability question does not wait for it.
+        while True:
+            delay = self.sync_interval
+            try:
+                await self.sync()
+            except asyncio.CancelledError:
+                raise
+            except CalendarAuthError as e:
+                # The calendar is optional: without credentials the tools say so; check again now and then.
+                logger.debug("Background calendar sync skipped: %s", e)
+                delay = max(delay, AUTH_RETRY_SECONDS)
+            except Exception as e:
+                # Queries fall back to syncing on demand until the next refresh succeeds.
+                logger.error("Background calendar sync failed: %s", e)
+            await asyncio.sleep(delay)
+
+    def start_refresher(self):
+        if self.sync_interval > 0 and self._refresher is None:
+            self._refresher = asyncio.create_task(self._refresh())
+
+    async def stop_refresher(self):
+        if self._refresher is not None:
+            self._refresher.cancel()
+            try:
+                await self._refresher
+            except asyncio.CancelledError:
+                pass
+            self._refresher = None
+
+    async def events_between(self, start: datetime.datetime, end: datetime.datetime) -> List[Dict[str, Any]]:
+        await self.ensure_fresh()
+        return self._index.overlapping(start, end)
+
+    async def events_on(self, day: datetime.date) -> List[Dict[str, Any]]:
+        start = datetime.datetime.combine(day, datetime.time.min, tzinfo=self.tz)
+        end = datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time.min, tzinfo=self.tz)
+        return await self.events_between(start, end)
+
+
+calendar_mirror = CalendarMirror()
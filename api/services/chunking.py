@@ -0,0 +1,113 @@
+import os
+import re
+from typing import List
+
+from langchain_core.documents import Document
+
+from api.services.prompt_budget import CHARS_PER_TOKEN, count_tokens
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_RULE = re.compile(r"^\s*(-{3,}|\*{3,}|_{3,})\s*$")
+SECTION_SEPARATOR = " > "
+
+
+def _split_block(lines: List[str], max_tokens: int) -> List[str]:
+    """Splits a section body into pieces of at most `max_tokens`, breaking between lines."""
+    pieces, current, used = [], [], 0
+    for line in lines:
+        cost = count_tokens(line) + 1
+        if current and used + cost > max_tokens:
+            pieces.append("\n".join(current).strip())
+            current, used = [], 0
+        current.append(line)
+        used += cost
+    if current:
+        pieces.append("\n".join(current).strip())
+    return [piece for piece in pieces if piece]
+
+
+def split_markdown(text: str, source: str, max_tokens: int) -> List[Document]:
+    """
+    Splits a markdown document along its headings. Every chunk holds the body of
+    one section (or a piece of it, for sections longer than `max_tokens`) and
+    starts with its heading path, e.g. "1. Bodas > Servicios específicos", which
+    is also stored in the metadata together with the position of the chunk.
+    """
+    chunks = []
+    headings: List[str] = []
+    body: List[str] = []
+
+    def flush():
+        if not any(line.strip() for line in body):
+            return
+        section = SECTION_SEPARATOR.join(headings) or os.path.basename(source)
+        for piece in _split_block(body, max_tokens):
+            chunks.append(Document(
+                page_content=f"{section}\n{piece}",
+                metadata={
+                    "source": os.path.basename(source),
+                    "section": section,
+                    "headings": list(headings),
+                    "chunk_index": len(chunks),
+                },
+            ))
+
+    for line in text.splitlines():
+        match = _HEADING.match(line)
+        if match:
+            flush()
+            body = []
+            level = len(match.group(1))
+            headings = headings[:level - 1] + [match.group(2)]
+        elif not _RULE.match(line):
+            body.append(line)
+    flush()
+    return chunks
+
+
+def _body(doc: Document) -> str:
+    prefix = doc.metadata.get("section", "") + "\n"
+    return doc.page_content[len(prefix):] if doc.page_content.startswith(prefix) else doc.page_content
+
+
+def build_context(docs: List[Document], budget: int) -> str:
+    """
+    Turns retrieved chunks into prompt context of at most `budget` tokens:
+    duplicates are dropped, chunks are picked in retrieval order until the
+    budget is spent, and the picked chunks are laid out in document order with
+    neighbouring chunks of the same section merged under a single heading.
+    """
+    seen, picked, used = set(), [], 0
+    for doc in docs:
+        key = (doc.metadata.get("source"), doc.metadata.get("chunk_index"), doc.page_content)
+        if key in seen:
+            continue
+        seen.add(key)
+        cost = count_tokens(doc.page_content)
+        if used + cost > budget:
+            if not picked:
+                # Even the best chunk is too long: keep its beginning.
+                picked.append(doc.model_copy(update={"page_content": doc.page_content[:budget * CHARS_PER_TOKEN]}))
+            continue
+        picked.append(doc)
+        used += cost
+
+    picked.sort(key=lambda doc: (doc.metadata.get("source", ""), doc.metadata.get("chunk_index", 0)))
+    blocks = []
+    previous = None
+    for doc in picked:
+        section = doc.metadata.get("section", "")
+        index = doc.metadata.get("chunk_index")
+        adjacent = (
+            previous is not None
+            and previous.metadata.get("source") == doc.metadata.get("source")
+            and previous.metadata.get("section") == section
+            and index is not None
+            and previous.metadata.get("chunk_index") == index - 1
+        )
+        if adjacent:
+            blocks[-1].append(_body(doc))
+        else:
+            blocks.append([f"[{section}]", _body(doc)])
+        previous = doc
+    return "\n\n".join("\n".join(block) for block in blocks)
@@ -0,0 +1,103 @@
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from api.services.answer_cache import answer_cache, is_eligible, is_cacheable
+from api.services.form_extraction import VERBATIM_FIELDS, extract_form_fields
+from api.services.history import append_turns, new_session_id
+from api.services.prompt_budget import merge_form_data, schedule_summary_refresh
+from api.services.write_behind import turn_writer
+
+logger = logging.getLogger(__name__)
+
+# One chat turn, shared by the chat routes and the batch runner (api/services/batch.py):
+# load the session, answer from the cache or the graph, then persist the turn.
+
+
+def empty_session() -> Dict[str, Any]:
+    return {"history": [], "first_seq": 0, "next_seq": 0, "summary": "", "summary_upto": 0, "form_data": {}}
+
+
+async def open_session(db, session_id: Optional[str]) -> Tuple[str, Dict[str, Any]]:
+    """Returns the session id and its conversational state (see history.load_session)."""
+    if session_id:
+        session = await turn_writer.load_session(db, session_id)
+        logger.debug("Session %s loaded: %d turns, summary: %s.", session_id, len(session["history"]), bool(session["summary"]))
+        return session_id, session
+
+    session_id = new_session_id(db)
+    logger.debug("New session created with ID: %s", session_id)
+    return session_id, empty_session()
+
+
+def _verbatim_fields(message: str) -> Dict[str, Any]:
+    fields = extract_form_fields(message)
+    return {field: fields[field] for field in VERBATIM_FIELDS if field in fields}
+
+
+def graph_inputs(message: str, session: Dict[str, Any]) -> Dict[str, Any]:
+    # The email and phone found in this message are passed as already collected, so the model does not
+    # extract them. Names and event types stay with the model, which can read them in full.
+    return {
+        "question": message,
+        "chat_history": session["history"],
+        "summary": session["summary"],
+        "form_data": merge_form_data(session["form_data"], _verbatim_fields(message)),
+    }
+
+
+def turn_form_data(session: Dict[str, Any], message: str, form_data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    The session's form data after this turn: earlier values, then the locally
+    found name and event type, then the model's values, then the locally found
+    email and phone (read verbatim from the message, so they win).
+    """
+    merged = merge_form_data(session["form_data"], extract_form_fields(message))
+    return merge_form_data(merge_form_data(merged, form_data), _verbatim_fields(message))
+
+
+async def save_turn(db, session_id: str, session: Dict[str, Any], message: str, reply_text: str,
+                    form_data: Optional[Dict[str, Any]], durable: bool = False) -> Tuple[Dict[str, Any], int]:
+    """
+    Saves the user/assistant turns and the merged form data; returns the form
+    data and the session's next sequence number. The turns are queued in the
+    write-behind layer and the summary is refreshed in the background, unless
+    `durable`: then the turns are in Firestore on return and the caller
+    refreshes the summary itself (see batch.BatchRunner).
+    """
+    merged_form_data = turn_form_data(session, message, form_data)
+    new_turns = [("user", message), ("assistant", reply_text)]
+    save = append_turns if durable else turn_writer.append
+    next_seq = await save(db, session_id, session["next_seq"], new_turns, {"form_data": merged_form_data})
+    if not durable:
+        schedule_summary_refresh(db, session_id, session, new_turns)
+    return merged_form_data, next_seq
+
+
+async def lookup_cached_answer(message: str, session: Dict[str, Any]):
+    """Returns (cached reply or None, question embedding or None) for cache-eligible questions."""
+    if not is_eligible(message, session):
+        return None, None
+    try:
+        vector = await answer_cache.embed(message)
+    except Exception as e:
+        logger.warning("Could not embed question, skipping the answer cache: %s", e)
+        return None, None
+    entry = answer_cache.lookup(vector)
+    return (entry["reply"] if entry else None), vector
+
+
+def maybe_cache_answer(vector, message: str, result: Dict[str, Any]):
+    if vector is not None and is_cacheable(result):
+        answer_cache.store(vector, message, result["generation"]["reply"])
+
+
+async def answer(message: str, session: Dict[str, Any]) -> Dict[str, Any]:
+    """Runs one turn through the answer cache or the graph and returns the generation (`reply`, `formData`)."""
+    cached_reply, question_vector = await lookup_cached_answer(message, session)
+    if cached_reply is not None:
+        return {"reply": cached_reply, "formData": {}}
+    # Imported here so the app starts without loading langgraph (api/services/warmup.py preloads it).
+    from api.services.agent import run_graph
+    result = await run_graph(graph_inputs(message, session))
+    maybe_cache_answer(question_vector, message, result)
+    return result.get("generation", {})
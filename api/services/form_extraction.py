@@ -0,0 +1,104 @@
+import re
+import logging
+from collections import Counter
+from typing import Dict, Optional
+
+from api.services.routing import normalize
+
+logger = logging.getLogger(__name__)
+
+# The values allowed for `eventType` (see RESPONDER_SYSTEM_PROMPT in agent.py).
+EVENT_TYPES = ("Wedding", "Birthday / Social", "Corporate", "Other")
+
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)*\.[a-zA-Z]{2,}")
+# 9 to 15 digits, optionally with an international prefix and space/dot/dash separators
+# ("612 34 56 78", "+34 612-345-678"). Dates and prices have fewer digits.
+PHONE_PATTERN = re.compile(r"(?<![\w+@.])(?:\+|00)?\d(?:[\s.-]?\d){8,14}(?![\w@])")
+# "Me llamo Lucía Martín", "mi nombre es María del Carmen López": up to five capitalized words,
+# joined by particles (de, del, de la, de los, de las, y). A bare "soy" is left to the model:
+# "Soy Vegetariana y quiero un menú" is not a name.
+_NAME_WORD = r"[A-ZÁÉÍÓÚÑÜ][a-záéíóúñü]+"
+_NAME_PARTICLE = r"(?i:de\s+(?:la|las|los)|del|de|y)"
+NAME_PATTERN = re.compile(
+    r"(?i:\b(?:me llamo|mi nombre es|my name is)\s+)"
+    rf"({_NAME_WORD}(?:\s+(?:{_NAME_PARTICLE}\s+)?{_NAME_WORD}){{0,4}})"
+)
+# Fields read verbatim from the message, which win over the model's value. The name and the
+# event type found locally are only a fallback for when the model does not return them.
+VERBATIM_FIELDS = ("email", "phone")
+
+# Word prefixes (accent-stripped, lower case) that point to one event type.
+EVENT_TYPE_KEYWORDS = {
+    "Wedding": (
+        "boda", "casamos", "casarnos", "casamiento", "matrimoni", "novios", "enlace",
+        "wedding", "marriage",
+    ),
+    "Birthday / Social": (
+        "cumple", "aniversari", "comunion", "bautiz", "baby shower", "despedida", "graduaci",
+        "quincea", "fiesta familiar", "birthday", "anniversary", "christening",
+    ),
+    "Corporate": (
+        "empresa", "corporativ", "conferenc", "congreso", "convenci", "team building", "afterwork",
+        "seminari", "lanzamiento de producto", "presentacion de producto", "corporate", "company",
+    ),
+}
+_EVENT_TYPE_PATTERNS = {
+    event_type: re.compile(r"\b(?:" + "|".join(re.escape(keyword) for keyword in keywords) + ")")
+    for event_type, keywords in EVENT_TYPE_KEYWORDS.items()
+}
+
+
+def extract_email(text: str) -> Optional[str]:
+    match = EMAIL_PATTERN.search(text)
+    return match.group(0).lower() if match else None
+
+
+def extract_phone(text: str) -> Optional[str]:
+    """First phone number in `text` (emails removed first), digits only with a leading "+" if international."""
+    match = PHONE_PATTERN.search(EMAIL_PATTERN.sub(" ", text))
+    if not match:
+        return None
+    raw = match.group(0)
+    digits = re.sub(r"\D", "", raw)
+    if raw.startswith("+"):
+        return f"+{digits}"
+    if raw.startswith("00"):
+        return f"+{digits[2:]}"
+    return digits
+
+
+def extract_name(text: str) -> Optional[str]:
+    match = NAME_PATTERN.search(text)
+    return match.group(1) if match else None
+
+
+def classify_event_type(text: str) -> Optional[str]:
+    """
+    Maps `text` to one of EVENT_TYPES by keyword. Returns None when no keyword
+    or more than one event type matches equally ("fiesta de empresa para una
+    boda"), leaving the decision to the model. "Other" is never chosen locally.
+    """
+    normalized = normalize(text)
+    counts = Counter({event_type: len(pattern.findall(normalized)) for event_type, pattern in _EVENT_TYPE_PATTERNS.items()})
+    ranked = [item for item in counts.most_common() if item[1] > 0]
+    if not ranked or (len(ranked) > 1 and ranked[0][1] == ranked[1][1]):
+        return None
+    return ranked[0][0]
+
+
+def extract_form_fields(message: str) -> Dict[str, str]:
+    """
+    Fields of the contact form that can be read off one user message without
+    the model: `email`, `phone`, `name` and `eventType`. Only the fields found
+    are returned; `message` (a summary of the request) is always left to the model.
+    """
+    fields = {
+        "name": extract_name(message),
+        "email": extract_email(message),
+        "phone": extract_phone(message),
+        "eventType": classify_event_type(message),
+    }
+    found = {key: value for key, value in fields.items() if value}
+    if found:
+        logger.debug("Form fields extracted locally: %s", sorted(found))
+    return found
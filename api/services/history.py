@@ -0,0 +1,213 @@
+import sys
+import asyncio
+import logging
+import argparse
+from typing import Any, Dict, List, Optional
+
+from google.api_core.exceptions import Conflict
+
+from api.core.clients import get_firestore
+from api.core.config import HISTORY_WINDOW
+from api.core.telemetry import configure_logging, traced
+
+logger = logging.getLogger(__name__)
+
+# Storage layout:
+#   chat_sessions/{session_id}                 -> {"turn_count": int, "updated_at": timestamp,
+#                                                  "summary": str, "summary_upto": int, "form_data": dict}
+#   chat_sessions/{session_id}/turns/{seq:08d} -> {"seq": int, "role": str, "content": str, "created_at": timestamp}
+# Legacy sessions keep the whole conversation in a `history` array on the
+# session document; they are migrated to turn records the first time they are read.
+SESSIONS_COLLECTION = "chat_sessions"
+TURNS_COLLECTION = "turns"
+MAX_BATCH_WRITES = 400  # Firestore allows 500 writes per batch
+APPEND_RETRIES = 3
+
+
+def _firestore_module():
+    # Imported on first use: google.cloud.firestore is slow to import and not needed to start the app.
+    from google.cloud import firestore as google_firestore
+    return google_firestore
+
+
+def _session_ref(db, session_id: str):
+    return db.collection(SESSIONS_COLLECTION).document(session_id)
+
+
+def _turn_ref(db, session_id: str, seq: int):
+    # Zero-padded ids keep the documents in sequence order in the console too.
+    return _session_ref(db, session_id).collection(TURNS_COLLECTION).document(f"{seq:08d}")
+
+
+def new_session_id(db) -> str:
+    return db.collection(SESSIONS_COLLECTION).document().id # This creates a reference, not the document
+
+
+async def _recent_turns(db, session_id: str, window: int):
+    google_firestore = _firestore_module()
+    query = (
+        _session_ref(db, session_id)
+        .collection(TURNS_COLLECTION)
+        .order_by("seq", direction=google_firestore.Query.DESCENDING)
+        .limit(window)
+    )
+    snapshots = await query.get()
+    return [snapshot.to_dict() for snapshot in reversed(snapshots)]
+
+
+@traced("firestore")
+async def migrate_legacy_history(db, session_id: str, history: List[dict]) -> int:
+    """
+    Rewrites a legacy `history` array as turn records and drops the array.
+    Idempotent: re-running it overwrites the same turn documents.
+    """
+    google_firestore = _firestore_module()
+    for offset in range(0, len(history), MAX_BATCH_WRITES):
+        batch = db.batch()
+        for seq, item in enumerate(history[offset:offset + MAX_BATCH_WRITES], start=offset):
+            batch.set(_turn_ref(db, session_id, seq), {
+                "seq": seq,
+                "role": item.get("role"),
+                "content": item.get("content"),
+                "created_at": google_firestore.SERVER_TIMESTAMP,
+            })
+        await batch.commit()
+    await _session_ref(db, session_id).set({
+        "history": google_firestore.DELETE_FIELD,
+        "turn_count": len(history),
+        "updated_at": google_firestore.SERVER_TIMESTAMP,
+    }, merge=True)
+    logger.info("Migrated session %s: %d turns.", session_id, len(history))
+    return len(history)
+
+
+@traced("firestore")
+async def load_session(db, session_id: str, window: int = HISTORY_WINDOW) -> Dict[str, Any]:
+    """
+    Loads the conversational state of a session:
+    - `history`: the last `window` turns not yet folded into the summary, as (role, content) tuples.
+    - `first_seq`: sequence number of history[0].
+    - `next_seq`: sequence number the next turn must use.
+    - `summary`: rolling summary of the turns before `summary_upto`.
+    - `summary_upto`: first turn not in the summary; turns between it and
+      `first_seq` fell out of the window before being summarized.
+    - `form_data`: form fields collected so far.
+    """
+    doc, turns = await asyncio.gather(_session_ref(db, session_id).get(), _recent_turns(db, session_id, window))
+    meta = (doc.to_dict() or {}) if doc.exists else {}
+
+    if not turns and meta.get("history"):
+        legacy_history = meta["history"]
+        await migrate_legacy_history(db, session_id, legacy_history)
+        turns = [{"seq": seq, **item} for seq, item in enumerate(legacy_history)][-window:]
+
+    next_seq = turns[-1]["seq"] + 1 if turns else 0
+    summary_upto = meta.get("summary_upto", 0)
+    turns = [turn for turn in turns if turn["seq"] >= summary_upto]
+    return {
+        "history": [(turn.get("role"), turn.get("content")) for turn in turns],
+        "first_seq": turns[0]["seq"] if turns else next_seq,
+        "next_seq": next_seq,
+        "summary": meta.get("summary", ""),
+        "summary_upto": summary_upto,
+        "form_data": meta.get("form_data", {}),
+    }
+
+
+def add_turns(batch, db, session_id: str, next_seq: int, turns: List[tuple],
+              session_fields: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Adds to `batch` the creation of the (role, content) turns starting at
+    `next_seq` and the session document update. Returns the number of writes.
+    """
+    google_firestore = _firestore_module()
+    for offset, (role, content) in enumerate(turns):
+        seq = next_seq + offset
+        batch.create(_turn_ref(db, session_id, seq), {
+            "seq": seq,
+            "role": role,
+            "content": content,
+            "created_at": google_firestore.SERVER_TIMESTAMP,
+        })
+    batch.set(_session_ref(db, session_id), {
+        **(session_fields or {}),
+        "turn_count": next_seq + len(turns),
+        "updated_at": google_firestore.SERVER_TIMESTAMP,
+    }, merge=True)
+    return len(turns) + 1
+
+
+@traced("firestore")
+async def append_turns(db, session_id: str, next_seq: int, turns: List[tuple],
+                       session_fields: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Appends (role, content) turns starting at `next_seq` and returns the new next
+    sequence number. `session_fields` are merged into the session document in the
+    same batch. Turn documents are created (never overwritten), so if a
+    concurrent request already used those sequence numbers the batch fails and is
+    retried after the tail of the session.
+    """
+    for attempt in range(APPEND_RETRIES):
+        batch = db.batch()
+        add_turns(batch, db, session_id, next_seq, turns, session_fields)
+        try:
+            await batch.commit()
+            return next_seq + len(turns)
+        except Conflict:
+            logger.warning("Sequence conflict appending to session %s (attempt %d).", session_id, attempt + 1)
+            last = await _recent_turns(db, session_id, 1)
+            next_seq = last[-1]["seq"] + 1 if last else 0
+    raise RuntimeError(f"Could not append turns to session {session_id} after {APPEND_RETRIES} attempts.")
+
+
+async def all_turns(db, session_id: str) -> List[Dict[str, Any]]:
+    """Every turn record of a session, in sequence order (for offline reprocessing)."""
+    query = _session_ref(db, session_id).collection(TURNS_COLLECTION).order_by("seq")
+    return [snapshot.to_dict() for snapshot in await query.get()]
+
+
+@traced("firestore")
+async def turns_between(db, session_id: str, start: int, end: int) -> List[tuple]:
+    """The (role, content) turns with start <= seq < end (read by id, so keep the range short)."""
+    snapshots = await asyncio.gather(*(_turn_ref(db, session_id, seq).get() for seq in range(start, end)))
+    turns = [snapshot.to_dict() for snapshot in snapshots if snapshot.exists]
+    return [(turn.get("role"), turn.get("content")) for turn in turns]
+
+
+async def session_ids(db) -> List[str]:
+    return [doc.id async for doc in db.collection(SESSIONS_COLLECTION).stream()]
+
+
+@traced("firestore")
+async def save_summary(db, session_id: str, summary: str, summary_upto: int):
+    """Stores the rolling summary, which covers every turn with seq < summary_upto."""
+    await _session_ref(db, session_id).set({"summary": summary, "summary_upto": summary_upto}, merge=True)
+
+
+async def migrate_all(db) -> int:
+    """Migrates every legacy session in the collection. Returns the number of migrated sessions."""
+    migrated = 0
+    async for doc in db.collection(SESSIONS_COLLECTION).stream():
+        legacy_history = (doc.to_dict() or {}).get("history")
+        if legacy_history:
+            await migrate_legacy_history(db, doc.id, legacy_history)
+            migrated += 1
+    return migrated
+
+
+def main(argv=None) -> int:
+    """Bulk-migrates legacy `history` arrays to append-only turn records."""
+    parser = argparse.ArgumentParser(description="Migrate chat_sessions history arrays to turn records.")
+    parser.parse_args(argv)
+    configure_logging()
+    db = get_firestore()
+    if not db:
+        print("Firestore is not configured (FIREBASE_SERVICE_ACCOUNT_JSON).")
+        return 1
+    migrated = asyncio.run(migrate_all(db))
+    print(f"Migrated {migrated} sessions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
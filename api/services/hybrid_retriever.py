@@ -0,0 +1,153 @@
+import re
+import math
+import unicodedata
+from collections import Counter, OrderedDict, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from api.core.config import HYBRID_KEYWORD_COVERAGE, QUERY_EMBEDDING_CACHE_SIZE
+from api.services.scheduler import embed_query
+
+_WORD = re.compile(r"\w+")
+# Spanish and English function words that carry no retrieval signal.
+STOPWORDS = {
+    "a", "al", "algo", "como", "con", "cual", "de", "del", "el", "ella", "en", "es", "esta", "este",
+    "hay", "la", "las", "le", "lo", "los", "me", "mi", "mas", "o", "para", "pero", "por", "que",
+    "se", "si", "sin", "su", "sus", "te", "tu", "un", "una", "unas", "uno", "unos", "y", "ya", "yo",
+    "hola", "quiero", "quisiera", "puedo", "podeis", "podrias", "teneis", "hacen", "haceis",
+    "the", "and", "or", "of", "to", "in", "for", "on", "with", "is", "are", "do", "you", "what", "how",
+}
+RRF_K = 60  # Reciprocal Rank Fusion constant
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cases, strips accents, drops stopwords and folds plurals."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    folded = "".join(char for char in decomposed if not unicodedata.combining(char))
+    tokens = []
+    for word in _WORD.findall(folded):
+        if word in STOPWORDS or len(word) < 2:
+            continue
+        # Light plural folding: "comuniones" -> "comunion", "talleres" -> "taller", "bodas" -> "boda".
+        if len(word) > 4 and word.endswith("es") and word[-3] in "lnrdzj":
+            word = word[:-2]
+        elif len(word) > 3 and word.endswith("s"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+class BM25Index:
+    """In-memory Okapi BM25 inverted index over a fixed list of documents."""
+
+    def __init__(self, texts: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self.doc_lengths = []
+        for doc_idx, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            self.doc_lengths.append(sum(counts.values()))
+            for term, freq in counts.items():
+                self.postings[term].append((doc_idx, freq))
+        self.avg_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+        n_docs = len(self.doc_lengths)
+        self.idf = {
+            term: math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def search(self, query: str, k: int) -> Tuple[List[Tuple[int, float]], float]:
+        """
+        Returns the top-`k` (doc_idx, score) pairs and the fraction of the query
+        terms contained in the best document.
+        """
+        terms = set(tokenize(query))
+        scores: Dict[int, float] = defaultdict(float)
+        matched_terms: Dict[int, int] = defaultdict(int)
+        for term in terms:
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_idx, freq in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_idx] / (self.avg_length or 1))
+                scores[doc_idx] += idf * freq * (self.k1 + 1) / (freq + norm)
+                matched_terms[doc_idx] += 1
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        coverage = matched_terms[ranked[0][0]] / len(terms) if ranked and terms else 0.0
+        return ranked, coverage
+
+
+class HybridRetriever:
+    """
+    Retriever that fuses BM25 keyword ranking with FAISS vector ranking using
+    Reciprocal Rank Fusion. Query embeddings are kept in an LRU cache, and
+    queries whose terms all appear in the best BM25 document are answered from
+    the keyword index alone, without calling the embeddings API.
+    """
+
+    def __init__(self, vectorstore, k: int = 3, fetch_k: int = 10,
+                 keyword_coverage: float = HYBRID_KEYWORD_COVERAGE,
+                 cache_size: int = QUERY_EMBEDDING_CACHE_SIZE):
+        self.vectorstore = vectorstore
+        self.k = k
+        self.fetch_k = fetch_k
+        self.keyword_coverage = keyword_coverage
+        self.cache_size = cache_size
+        self._embedding_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self.stats = {"queries": 0, "keyword_only": 0, "embedding_cache_hits": 0, "embedding_calls": 0}
+
+        self.documents: List[Document] = [
+            vectorstore.docstore.search(doc_id) for doc_id in vectorstore.index_to_docstore_id.values()
+        ]
+        self._positions = {self._doc_key(doc): idx for idx, doc in enumerate(self.documents)}
+        self.bm25 = BM25Index([doc.page_content for doc in self.documents])
+
+    @staticmethod
+    def _doc_key(doc: Document) -> str:
+        return doc.id or doc.page_content
+
+    async def _embed_query(self, query: str) -> List[float]:
+        key = " ".join(query.lower().split())
+        vector = self._embedding_cache.get(key)
+        if vector is not None:
+            self._embedding_cache.move_to_end(key)
+            self.stats["embedding_cache_hits"] += 1
+            return vector
+        self.stats["embedding_calls"] += 1
+        vector = await embed_query(self.vectorstore.embeddings, query, name="retrieval")
+        self._embedding_cache[key] = vector
+        while len(self._embedding_cache) > self.cache_size:
+            self._embedding_cache.popitem(last=False)
+        return vector
+
+    async def _vector_ranking(self, query: str) -> List[int]:
+        vector = await self._embed_query(query)
+        results = await self.vectorstore.asimilarity_search_with_score_by_vector(vector, k=self.fetch_k)
+        return [self._positions[self._doc_key(doc)] for doc, _ in results if self._doc_key(doc) in self._positions]
+
+    async def ainvoke(self, query: str, mode: Optional[str] = None) -> List[Document]:
+        """
+        Returns the top-k documents for `query`. `mode` forces "bm25", "dense" or
+        "hybrid" ranking (used by the evaluation script); by default keyword-answerable
+        queries skip the embedding call.
+        """
+        self.stats["queries"] += 1
+        keyword_ranked, coverage = self.bm25.search(query, self.fetch_k)
+        keyword_ranking = [doc_idx for doc_idx, _ in keyword_ranked]
+
+        if mode == "bm25" or (mode is None and keyword_ranking and coverage >= self.keyword_coverage):
+            self.stats["keyword_only"] += 1
+            return [self.documents[idx] for idx in keyword_ranking[:self.k]]
+
+        vector_ranking = await self._vector_ranking(query)
+        if mode == "dense":
+            return [self.documents[idx] for idx in vector_ranking[:self.k]]
+
+        fused: Dict[int, float] = defaultdict(float)
+        for ranking in (keyword_ranking, vector_ranking):
+            for rank, doc_idx in enumerate(ranking):
+                fused[doc_idx] += 1.0 / (RRF_K + rank + 1)
+        best = sorted(fused, key=fused.get, reverse=True)[:self.k]
+        return [self.documents[idx] for idx in best]
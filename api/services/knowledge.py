@@ -0,0 +1,250 @@
+import os
+import sys
+import json
+import glob
+import shutil
+import hashlib
+import logging
+import argparse
+import tempfile
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from api.core.clients import get_embeddings
+from api.core.config import KNOWLEDGE_DIR, KNOWLEDGE_GLOB, EMBEDDING_MODEL, INDEX_CACHE_DIR, INDEX_CACHE_KEEP, CHUNK_MAX_TOKENS
+from api.core.telemetry import configure_logging
+from api.services.chunking import split_markdown
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+
+logger = logging.getLogger(__name__)
+
+# Splitter settings are part of the cache key: changing them invalidates prebuilt indexes.
+SPLITTER_SETTINGS = {"splitter": "markdown_sections", "max_tokens": CHUNK_MAX_TOKENS}
+MANIFEST_NAME = "manifest.json"
+
+
+def discover_files(knowledge_dir: str = KNOWLEDGE_DIR, pattern: str = KNOWLEDGE_GLOB) -> List[str]:
+    """Returns the knowledge files in `knowledge_dir` matching `pattern`, sorted by name."""
+    return sorted(glob.glob(os.path.join(knowledge_dir, pattern)))
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def compute_index_key(doc_paths: List[str], splitter_settings: dict, embedding_model: str) -> str:
+    """
+    Builds a content-addressed key for the index from the source documents,
+    the splitter settings and the embedding model.
+    """
+    hasher = hashlib.sha256()
+    for path in sorted(doc_paths):
+        with open(path, "rb") as f:
+            file_hash = hashlib.sha256(f.read()).hexdigest()
+        hasher.update(f"{os.path.basename(path)}:{file_hash}\n".encode("utf-8"))
+    hasher.update(json.dumps(splitter_settings, sort_keys=True).encode("utf-8"))
+    hasher.update(embedding_model.encode("utf-8"))
+    return hasher.hexdigest()[:32]
+
+
+def load_chunks(doc_paths: Optional[List[str]] = None) -> List[Document]:
+    """
+    Loads the knowledge files and splits them into section-aware chunks (see
+    chunking.split_markdown). Each chunk gets a stable id derived from its
+    source file and content.
+    """
+    chunks = []
+    ids = set()
+    for path in doc_paths or discover_files():
+        with open(path, encoding="utf-8") as f:
+            for chunk in split_markdown(f.read(), path, SPLITTER_SETTINGS["max_tokens"]):
+                base_id = chunk_id = content_hash(f"{chunk.metadata['source']}\n{chunk.page_content}")[:24]
+                # The same section repeated verbatim in one file still needs distinct ids.
+                suffix = 1
+                while chunk_id in ids:
+                    suffix += 1
+                    chunk_id = f"{base_id}-{suffix}"
+                chunk.id = chunk_id
+                ids.add(chunk_id)
+                chunks.append(chunk)
+    return chunks
+
+
+def vectors_by_content(vectorstore: "FAISS") -> Dict[str, List[float]]:
+    """Maps the content hash of every chunk in `vectorstore` to its stored vector."""
+    vectors = {}
+    for position, doc_id in vectorstore.index_to_docstore_id.items():
+        doc = vectorstore.docstore.search(doc_id)
+        if isinstance(doc, Document):
+            vectors[content_hash(doc.page_content)] = vectorstore.index.reconstruct(int(position)).tolist()
+    return vectors
+
+
+def _build_vectorstore(doc_paths: List[str], embeddings, previous: Optional["FAISS"] = None) -> Tuple["FAISS", dict]:
+    """
+    Builds the index for `doc_paths`. Chunks whose content is already in
+    `previous` reuse its vectors; only new or changed chunks are embedded, and
+    chunks that no longer exist are simply left out.
+    """
+    # FAISS (and the langchain vectorstore stack) is imported on first use to keep app startup fast.
+    from langchain_community.vectorstores import FAISS
+
+    chunks = load_chunks(doc_paths)
+    known = vectors_by_content(previous) if previous is not None else {}
+    hashes = [content_hash(chunk.page_content) for chunk in chunks]
+    missing = sorted({h: chunk.page_content for h, chunk in zip(hashes, chunks) if h not in known}.items())
+    if missing:
+        logger.info("Embedding %d of %d chunks with '%s'.", len(missing), len(chunks), EMBEDDING_MODEL)
+        vectors = embeddings.embed_documents([text for _, text in missing])
+        known.update({h: vector for (h, _), vector in zip(missing, vectors)})
+    current = set(hashes)
+    stats = {
+        "chunks": len(chunks),
+        "embedded": len(missing),
+        "reused": len(current) - len(missing),
+        "removed": len(set(known) - current),
+    }
+    vectorstore = FAISS.from_embeddings(
+        [(chunk.page_content, known[h]) for chunk, h in zip(chunks, hashes)],
+        embeddings,
+        metadatas=[chunk.metadata for chunk in chunks],
+        ids=[chunk.id for chunk in chunks],
+    )
+    return vectorstore, stats
+
+
+def load_cached_index(key: str, embeddings, cache_dir: str = INDEX_CACHE_DIR) -> Optional["FAISS"]:
+    """Loads a prebuilt index for `key` from disk, or returns None if it is missing or unreadable."""
+    from langchain_community.vectorstores import FAISS
+
+    index_dir = os.path.join(cache_dir, key)
+    if not os.path.exists(os.path.join(index_dir, MANIFEST_NAME)):
+        return None
+    try:
+        # The pickle only ever comes from our own cache directory (written by save_cached_index).
+        return FAISS.load_local(index_dir, embeddings, allow_dangerous_deserialization=True)
+    except Exception as e:
+        logger.error("Could not load cached index %s: %s", key, e)
+        return None
+
+
+def _cached_keys(cache_dir: str = INDEX_CACHE_DIR) -> List[str]:
+    """Keys of the cached indexes built with the current embedding model, most recently written first."""
+    candidates = []
+    for manifest_path in glob.glob(os.path.join(cache_dir, "*", MANIFEST_NAME)):
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if manifest.get("embedding_model") == EMBEDDING_MODEL and manifest.get("key"):
+            candidates.append((os.path.getmtime(manifest_path), manifest["key"]))
+    return [key for _, key in sorted(candidates, reverse=True)]
+
+
+def latest_cached_index(embeddings, exclude: Optional[str] = None, cache_dir: str = INDEX_CACHE_DIR) -> Optional["FAISS"]:
+    """Loads the most recently written cached index built with the current embedding model."""
+    for key in _cached_keys(cache_dir):
+        if key == exclude:
+            continue
+        vectorstore = load_cached_index(key, embeddings, cache_dir)
+        if vectorstore is not None:
+            return vectorstore
+    return None
+
+
+def save_cached_index(key: str, vectorstore: "FAISS", doc_paths: List[str], cache_dir: str = INDEX_CACHE_DIR) -> Optional[str]:
+    """
+    Saves the index (vectors plus chunk docstore) under `cache_dir/key`.
+    The index is written to a temporary directory first and then renamed, so a
+    concurrent reader never sees a half-written index.
+    """
+    index_dir = os.path.join(cache_dir, key)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=f".{key}-", dir=cache_dir)
+        vectorstore.save_local(tmp_dir)
+        manifest = {
+            "key": key,
+            "sources": [os.path.basename(path) for path in doc_paths],
+            "splitter": SPLITTER_SETTINGS,
+            "embedding_model": EMBEDDING_MODEL,
+            "chunks": len(vectorstore.index_to_docstore_id),
+        }
+        with open(os.path.join(tmp_dir, MANIFEST_NAME), "w") as f:
+            json.dump(manifest, f, indent=2)
+        if os.path.exists(index_dir):
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        else:
+            os.rename(tmp_dir, index_dir)
+        return index_dir
+    except OSError as e:
+        # Read-only filesystems (e.g. serverless) can still serve the freshly built index.
+        logger.error("Could not save index to %s: %s", index_dir, e)
+        return None
+
+
+def prune_cached_indexes(current_key: str, keep: int = INDEX_CACHE_KEEP, cache_dir: str = INDEX_CACHE_DIR) -> List[str]:
+    """
+    Deletes the cached indexes of the current embedding model except `current_key`
+    and the most recent others, `keep` in total. Returns the deleted keys.
+    """
+    others = [key for key in _cached_keys(cache_dir) if key != current_key]
+    removed = others[max(keep - 1, 0):]
+    for key in removed:
+        shutil.rmtree(os.path.join(cache_dir, key), ignore_errors=True)
+    if removed:
+        logger.info("Removed %d old cached indexes from %s.", len(removed), cache_dir)
+    return removed
+
+
+def load_vectorstore(doc_paths: Optional[List[str]] = None, force_rebuild: bool = False,
+                     previous: Optional["FAISS"] = None) -> Tuple["FAISS", str]:
+    """
+    Returns the FAISS vectorstore for the knowledge files and its key, loading it
+    from the on-disk cache when the key matches and building (and caching) it
+    otherwise. A build re-embeds only the chunks that are not in `previous`
+    (by default the most recent cached index); `force_rebuild` re-embeds everything.
+    """
+    embeddings = get_embeddings(EMBEDDING_MODEL)
+    doc_paths = doc_paths or discover_files()
+    if not doc_paths:
+        raise FileNotFoundError(f"No knowledge files matching '{KNOWLEDGE_GLOB}' found in: {KNOWLEDGE_DIR}")
+    for path in doc_paths:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Knowledge file not found at: {path}")
+    key = compute_index_key(doc_paths, SPLITTER_SETTINGS, EMBEDDING_MODEL)
+
+    if not force_rebuild:
+        vectorstore = load_cached_index(key, embeddings)
+        if vectorstore is not None:
+            logger.info("Loaded cached index %s.", key)
+            return vectorstore, key
+        if previous is None:
+            previous = latest_cached_index(embeddings, exclude=key)
+    else:
+        previous = None
+
+    logger.info("Building index %s from %d file(s).", key, len(doc_paths))
+    vectorstore, stats = _build_vectorstore(doc_paths, embeddings, previous)
+    logger.info("Index %s built: %s", key, stats)
+    save_cached_index(key, vectorstore, doc_paths)
+    return vectorstore, key
+
+
+def main(argv=None) -> int:
+    """Prebuilds the index so it can be shipped inside the Docker image."""
+    parser = argparse.ArgumentParser(description="Build the NonaEventos FAISS index cache.")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if a cached index exists.")
+    args = parser.parse_args(argv)
+    configure_logging()
+    load_vectorstore(force_rebuild=args.force)
+    print(f"Index cache ready in {INDEX_CACHE_DIR}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
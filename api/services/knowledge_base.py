@@ -0,0 +1,156 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from api.core.config import EMBEDDING_MODEL, KNOWLEDGE_WATCH_INTERVAL_SECONDS, RETRIEVAL_K
+from api.services import knowledge
+from api.services.answer_cache import answer_cache
+from api.services.hybrid_retriever import HybridRetriever
+
+logger = logging.getLogger(__name__)
+
+
+class KnowledgeBase:
+    """
+    Owns the retriever over the knowledge files and hot-reloads it when they
+    change. A reload builds a complete new index (re-embedding only the chunks
+    whose content changed) and then swaps it in with a single assignment, so
+    requests that already picked up the previous retriever finish with it.
+    """
+
+    def __init__(self, watch_interval: float = KNOWLEDGE_WATCH_INTERVAL_SECONDS):
+        self.watch_interval = watch_interval
+        self.retriever: Optional[HybridRetriever] = None
+        self.index_key: Optional[str] = None
+        self._signature: Optional[Tuple] = None
+        self._lock = asyncio.Lock()
+        self._watcher: Optional[asyncio.Task] = None
+        self.stats = {"reloads": 0, "failed_reloads": 0, "last_reload_at": None, "last_reload": None}
+
+    @property
+    def vectorstore(self):
+        retriever = self.retriever
+        return retriever.vectorstore if retriever else None
+
+    @staticmethod
+    def _files_signature() -> Tuple:
+        """Name, size and modification time of every knowledge file (cheap change detection)."""
+        signature = []
+        for path in knowledge.discover_files():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            signature.append((path, stat.st_size, stat.st_mtime_ns))
+        return tuple(signature)
+
+    @staticmethod
+    def _build(paths, force_rebuild: bool = False, previous=None) -> Tuple[HybridRetriever, str]:
+        vectorstore, key = knowledge.load_vectorstore(paths, force_rebuild, previous)
+        return HybridRetriever(vectorstore, k=RETRIEVAL_K), key
+
+    def _install(self, retriever: HybridRetriever, key: str, signature: Tuple):
+        # The new retriever is fully built before this single assignment; readers never see a partial index.
+        self.retriever = retriever
+        self.index_key = key
+        self._signature = signature
+        answer_cache.set_knowledge_version(key)
+
+    def load(self, force_rebuild: bool = False):
+        """Loads (or builds) the index synchronously; used at startup."""
+        signature = self._files_signature()
+        retriever, key = self._build([path for path, _, _ in signature], force_rebuild)
+        self._install(retriever, key, signature)
+        knowledge.prune_cached_indexes(key)
+
+    async def ensure_loaded(self) -> Optional[HybridRetriever]:
+        """Returns the retriever, loading the index first if the startup warm-up has not done it yet."""
+        if self.retriever is None:
+            async with self._lock:
+                if self.retriever is None:
+                    await asyncio.to_thread(self.load)
+        return self.retriever
+
+    async def reload(self, force: bool = False) -> Dict[str, Any]:
+        """
+        Rebuilds the index from the current knowledge files if their content
+        changed (or always with `force`) and swaps it in. The build runs in a
+        worker thread, so requests keep being served meanwhile. Returns a
+        summary of what happened.
+        """
+        async with self._lock:
+            signature = self._files_signature()
+            paths = [path for path, _, _ in signature]
+            key = await asyncio.to_thread(
+                knowledge.compute_index_key, paths, knowledge.SPLITTER_SETTINGS, EMBEDDING_MODEL
+            )
+            if key == self.index_key and not force:
+                self._signature = signature
+                return {"status": "unchanged", "index_key": key, "files": [os.path.basename(p) for p in paths]}
+
+            start = time.perf_counter()
+            previous_key = self.index_key
+            try:
+                retriever, key = await asyncio.to_thread(self._build, paths, False, self.vectorstore)
+            except Exception:
+                self.stats["failed_reloads"] += 1
+                raise
+            self._install(retriever, key, signature)
+            # Every edit of the knowledge files writes a new index; keep the cache directory bounded.
+            await asyncio.to_thread(knowledge.prune_cached_indexes, key)
+            summary = {
+                "status": "reloaded",
+                "index_key": key,
+                "previous_index_key": previous_key,
+                "files": [os.path.basename(p) for p in paths],
+                "chunks": len(retriever.documents),
+                "duration_ms": round((time.perf_counter() - start) * 1000),
+            }
+            self.stats["reloads"] += 1
+            self.stats["last_reload_at"] = time.time()
+            self.stats["last_reload"] = summary
+            logger.info("Knowledge base reloaded: %s -> %s (%d chunks).", previous_key, key, summary["chunks"])
+            return summary
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            try:
+                if self._files_signature() != self._signature:
+                    logger.info("Knowledge files changed on disk. Reloading.")
+                    await self.reload()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Keep serving the previous index and retry on the next change to the files.
+                logger.error("Knowledge base reload failed: %s", e)
+                self._signature = self._files_signature()
+
+    def start_watcher(self):
+        if self.watch_interval > 0 and self._watcher is None:
+            self._watcher = asyncio.create_task(self._watch())
+
+    async def stop_watcher(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+
+    def status(self) -> Dict[str, Any]:
+        vectorstore = self.vectorstore
+        return {
+            **self.stats,
+            "index_key": self.index_key,
+            "files": [os.path.basename(path) for path, _, _ in (self._signature or ())],
+            "chunks": len(vectorstore.index_to_docstore_id) if vectorstore is not None else 0,
+            "watching": self._watcher is not None,
+            "retriever": dict(self.retriever.stats) if self.retriever else None,
+        }
+
+
+knowledge_base = KnowledgeBase()
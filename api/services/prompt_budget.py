@@ -0,0 +1,137 @@
+import json
+import math
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from api.core.clients import get_chat_model
+from api.core.config import HISTORY_WINDOW, SUMMARY_TRIGGER_TOKENS
+from api.services.history import save_summary, turns_between
+from api.services.scheduler import invoke_model
+
+logger = logging.getLogger(__name__)
+
+# Rough size of a Gemini token for Spanish/English text. Counting locally keeps
+# prompt assembly free of network calls; the budgets only need to be approximately right.
+CHARS_PER_TOKEN = 4
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a customer and the NonaEventos virtual assistant.
+Update the existing summary with the new messages. Keep every concrete detail the assistant may need later:
+names, contact details, event type, dates, number of guests, budget, preferences and open questions.
+Write at most 150 words, in the language of the conversation. Reply with the summary only."""
+
+# Strong references to background summary tasks so they are not garbage collected mid-flight.
+_background_tasks = set()
+
+
+def count_tokens(text: str) -> int:
+    """Approximate token count of `text`."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def _turn_tokens(turn: Tuple[str, str]) -> int:
+    # A few tokens of per-message overhead for the role marker.
+    return count_tokens(turn[1] or "") + 4
+
+
+def select_recent_turns(history: Sequence[tuple], budget: int) -> List[tuple]:
+    """Returns the longest suffix of `history` whose turns fit in `budget` tokens."""
+    kept = []
+    used = 0
+    for turn in reversed(history):
+        cost = _turn_tokens(turn)
+        if used + cost > budget:
+            break
+        kept.append(turn)
+        used += cost
+    kept.reverse()
+    return kept
+
+
+def compact_form_data(form_data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {key: value for key, value in (form_data or {}).items() if value not in (None, "")}
+
+
+def merge_form_data(previous: Optional[Dict[str, Any]], extracted: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Values extracted this turn override earlier ones; fields the model left empty keep their earlier value."""
+    merged = compact_form_data(previous)
+    merged.update(compact_form_data(extracted))
+    return merged
+
+
+def build_context_messages(state: Dict[str, Any], budget: int) -> List[tuple]:
+    """
+    Builds the conversational context for a node within `budget` tokens: the
+    rolling summary of older turns, the form data collected so far and as many
+    of the most recent turns as still fit, verbatim.
+    """
+    messages = []
+    summary = state.get("summary")
+    if summary:
+        messages.append(("system", f"Summary of the earlier conversation:\n{summary}"))
+    form_data = compact_form_data(state.get("form_data"))
+    if form_data:
+        messages.append(("system", f"Form data already collected: {json.dumps(form_data, ensure_ascii=False)}"))
+
+    remaining = budget - sum(count_tokens(content) for _, content in messages)
+    messages.extend(select_recent_turns(state.get("chat_history", []), max(remaining, 0)))
+    return messages
+
+
+async def summarize(previous_summary: str, turns: Sequence[tuple]) -> str:
+    transcript = "\n".join(f"{role}: {content}" for role, content in turns)
+    messages = [
+        ("system", SUMMARY_PROMPT),
+        ("user", f"Existing summary:\n{previous_summary or '(empty)'}\n\nNew messages:\n{transcript}"),
+    ]
+    response = await invoke_model(get_chat_model(temperature=0), messages, name="summary")
+    return response.content.strip() if isinstance(response.content, str) else str(response.content)
+
+
+async def refresh_summary(db, session_id: str, session: Dict[str, Any], new_turns: Sequence[tuple],
+                          save: bool = True) -> Optional[Tuple[str, int]]:
+    """
+    Folds the oldest unsummarized turns into the session summary once the
+    unsummarized part of the conversation exceeds SUMMARY_TRIGGER_TOKENS or
+    would no longer fit in the loaded window (HISTORY_WINDOW turns). The most
+    recent turns that fit in half of each limit stay verbatim. Turns that
+    already fell out of the window unsummarized are read back and folded
+    first, at most HISTORY_WINDOW of them per call. Returns the new
+    (summary, summary_upto), or None if nothing was folded; `save` stores it.
+    """
+    first_seq = session["first_seq"]
+    summary_upto = min(session.get("summary_upto", first_seq), first_seq)
+    turns = list(session["history"]) + list(new_turns)
+    if (summary_upto == first_seq and len(turns) < HISTORY_WINDOW
+            and sum(_turn_tokens(turn) for turn in turns) <= SUMMARY_TRIGGER_TOKENS):
+        return None
+
+    missing_end = min(first_seq, summary_upto + HISTORY_WINDOW)
+    to_fold = await turns_between(db, session_id, summary_upto, missing_end) if summary_upto < first_seq else []
+    if missing_end == first_seq:
+        keep = min(len(select_recent_turns(turns, SUMMARY_TRIGGER_TOKENS // 2)), HISTORY_WINDOW // 2)
+        to_fold += turns[:len(turns) - keep]
+        summary_upto = first_seq + len(turns) - keep
+    else:
+        # Still catching up on a long unsummarized stretch: the loaded turns wait for the next call.
+        summary_upto = missing_end
+    if not to_fold:
+        return None
+    summary = await summarize(session.get("summary", ""), to_fold)
+    if save:
+        await save_summary(db, session_id, summary, summary_upto)
+    logger.info("Session %s: folded %d turns, summary covers seq < %d.", session_id, len(to_fold), summary_upto)
+    return summary, summary_upto
+
+
+def schedule_summary_refresh(db, session_id: str, session: Dict[str, Any], new_turns: Sequence[tuple]):
+    """Runs refresh_summary in the background so it never delays the reply."""
+    async def runner():
+        try:
+            await refresh_summary(db, session_id, session, new_turns)
+        except Exception as e:
+            logger.error("Could not update summary for session %s: %s", session_id, e)
+
+    task = asyncio.create_task(runner())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
@@ -0,0 +1,72 @@
+import re
+import unicodedata
+from typing import Sequence
+
+from api.core.config import ROUTING_MODE
+
+# Routing modes (ROUTING_MODE):
+# - "planner":    every turn runs the tool-planning call, then the responder (two LLM calls).
+# - "classifier": a local keyword classifier sends turns that clearly need no tool straight
+#                 to the responder (one LLM call); everything else goes through the planner.
+#                 Follow-ups ("sí, por favor", "¿y para 100 personas?") of an assistant turn
+#                 about services or dates always go through the planner.
+# - "single":     one tool-enabled call that either answers with the final JSON or asks for
+#                 tools; only turns that use tools pay for a second call.
+ROUTING_MODES = {"planner", "classifier", "single"}
+
+if ROUTING_MODE not in ROUTING_MODES:
+    raise ValueError(f"Invalid ROUTING_MODE '{ROUTING_MODE}'. Must be one of: {', '.join(sorted(ROUTING_MODES))}.")
+
+# Word prefixes that suggest the knowledge base or the calendar is needed to answer.
+# Matched against the accent-stripped, lower-cased message.
+TOOL_HINTS = (
+    # Services and prices (search_event_info)
+    "precio", "cuest", "cuant", "coste", "cost", "presupuest", "tarifa", "servici", "ofrec", "incluy",
+    "boda", "cumple", "comuni", "bautiz", "aniversari", "corporativ", "empresa", "conferenc", "team",
+    "fiesta", "evento", "catering", "menu", "decoraci", "flor", "fotograf", "video", "music", "dj",
+    "animaci", "tematic", "proveedor", "como lo hac", "proceso",
+    "price", "service", "wedding", "birthday", "party", "event", "package",
+    # Availability (calendar tools)
+    "disponib", "fecha", "libre", "ocupad", "calendari", "agenda", "reserv", "dia ", "dias",
+    "semana", "mes ", "meses", "manana", "lunes", "martes", "miercoles", "jueves", "viernes",
+    "sabado", "domingo", "enero", "febrero", "marzo", "abril", "mayo", "junio", "julio",
+    "agosto", "septiembre", "octubre", "noviembre", "diciembre", "cuando",
+    "available", "date", "calendar", "book", "week", "month", "when",
+)
+# Longer messages are left to the planner even without hints.
+MAX_DIRECT_WORDS = 12
+_WORD = re.compile(r"\w+")
+
+
+def normalize(text: str) -> str:
+    """Lower-cases and strips accents, so keyword prefixes match however the user typed them."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def _has_tool_hints(text: str) -> bool:
+    padded = f" {normalize(text)} "
+    return any(hint in padded for hint in TOOL_HINTS)
+
+
+def needs_tools(question: str, chat_history: Sequence[tuple] = ()) -> bool:
+    """
+    Cheap local decision of whether answering `question` may need a tool. It is
+    deliberately conservative: only short messages without any service,
+    price or date vocabulary (greetings, thanks, contact details) skip the planner,
+    and only on the first turn or after an assistant turn without such vocabulary:
+    a short reply may be accepting an offer to check prices or dates.
+    """
+    if len(_WORD.findall(normalize(question))) > MAX_DIRECT_WORDS or _has_tool_hints(question):
+        return True
+    last_reply = next((content for role, content in reversed(chat_history) if role == "assistant"), None)
+    return bool(last_reply) and _has_tool_hints(last_reply)
+
+
+def choose_route(question: str, chat_history: Sequence[tuple] = (), mode: str = ROUTING_MODE) -> str:
+    """Returns the first node to run for `question`: "agent", "responder" or "single"."""
+    if mode == "single":
+        return "single"
+    if mode == "classifier" and not needs_tools(question, chat_history):
+        return "responder"
+    return "agent"
@@ -0,0 +1,239 @@
+import json
+import math
+import time
+import random
+import asyncio
+import hashlib
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from langchain_core.exceptions import ModelConnectionError, ModelRateLimitError, ModelTimeoutError
+
+from api.core.config import (
+    LLM_MAX_CONCURRENCY,
+    EMBEDDING_MAX_CONCURRENCY,
+    UPSTREAM_MAX_QUEUE,
+    UPSTREAM_MAX_WAIT_SECONDS,
+    UPSTREAM_MAX_RETRIES,
+    UPSTREAM_RETRY_BASE_SECONDS,
+)
+from api.core.telemetry import metrics, record_usage, span
+
+logger = logging.getLogger(__name__)
+
+# Upstream responses worth retrying: throttling and transient server errors.
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+_RETRYABLE_MARKERS = ("UNAVAILABLE", "rate limit")
+WAIT_SAMPLES = 1000  # Recent queue waits kept for the percentiles
+
+
+class Overloaded(Exception):
+    """Raised when a call cannot be admitted in time; `retry_after` is a hint in seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+def _status_code(exc: Exception) -> Optional[int]:
+    for attr in ("status_code", "code"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def is_throttled(exc: Exception) -> bool:
+    if isinstance(exc, ModelRateLimitError) or _status_code(exc) == 429:
+        return True
+    text = str(exc)
+    return "RESOURCE_EXHAUSTED" in text or "Too Many Requests" in text
+
+
+def is_retryable(exc: Exception) -> bool:
+    if is_throttled(exc) or isinstance(exc, (ModelConnectionError, ModelTimeoutError, asyncio.TimeoutError)):
+        return True
+    if _status_code(exc) in RETRYABLE_STATUS:
+        return True
+    text = str(exc)
+    return any(marker in text for marker in _RETRYABLE_MARKERS)
+
+
+def prompt_key(target: Any, payload: Any) -> str:
+    """
+    Single-flight key of a call: the client object (clients.py hands out one
+    object per model configuration) plus a hash of the prompt.
+    """
+    digest = hashlib.sha256(json.dumps(payload, default=repr, ensure_ascii=False).encode("utf-8")).hexdigest()
+    return f"{id(target)}:{digest}"
+
+
+def _percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class UpstreamScheduler:
+    """
+    Admission control for calls to an upstream API (Gemini chat or embeddings).
+
+    - At most `max_concurrency` calls run at once; the rest wait in a queue of
+      at most `max_queue` callers.
+    - A caller that cannot start within `max_wait` seconds (or that would
+      certainly not, judging by the queue length and recent call durations) is
+      shed with `Overloaded`, which the API turns into a 429 with Retry-After.
+    - Throttling and transient errors are retried with jittered exponential
+      backoff, keeping the slot so a throttled provider sees less concurrency.
+    - Identical calls in flight at the same time (same `key`) share one
+      upstream call.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int = UPSTREAM_MAX_QUEUE,
+                 max_wait: float = UPSTREAM_MAX_WAIT_SECONDS, max_retries: int = UPSTREAM_MAX_RETRIES,
+                 retry_base: float = UPSTREAM_RETRY_BASE_SECONDS):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self._avg_duration = 1.0  # Exponential moving average of call durations (seconds)
+        self.waiting = 0
+        self.running = 0
+        self.stats = {"calls": 0, "coalesced": 0, "shed": 0, "retries": 0, "errors": 0, "max_queue_depth": 0}
+
+    def estimated_wait(self) -> float:
+        """Expected time a new caller waits for a slot, from the queue length and recent call durations."""
+        ahead = self.waiting + self.running - self.max_concurrency + 1
+        return max(0.0, ahead) * self._avg_duration / self.max_concurrency
+
+    def admit(self):
+        """Raises Overloaded if a new call would not get a slot before its deadline."""
+        if self.waiting >= self.max_queue:
+            self.stats["shed"] += 1
+            raise Overloaded(f"{self.name}: queue full ({self.waiting} waiting).", self.estimated_wait())
+        estimate = self.estimated_wait()
+        if estimate > self.max_wait:
+            self.stats["shed"] += 1
+            raise Overloaded(f"{self.name}: estimated wait {estimate:.1f}s exceeds {self.max_wait:.0f}s.", estimate)
+
+    async def _acquire(self):
+        self.admit()
+        self.waiting += 1
+        self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self.waiting)
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            self.stats["shed"] += 1
+            raise Overloaded(f"{self.name}: no slot within {self.max_wait:.0f}s.", self.estimated_wait())
+        finally:
+            self.waiting -= 1
+            waited = time.monotonic() - start
+            self._waits.append(waited)
+            metrics.observe("queue", self.name, waited)
+        self.running += 1
+
+    def _release(self):
+        self.running -= 1
+        self._semaphore.release()
+
+    async def _execute(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        await self._acquire()
+        try:
+            attempt = 0
+            while True:
+                start = time.monotonic()
+                try:
+                    result = await call()
+                    self._avg_duration = 0.8 * self._avg_duration + 0.2 * (time.monotonic() - start)
+                    return result
+                except Exception as e:
+                    if attempt >= self.max_retries or not is_retryable(e):
+                        self.stats["errors"] += 1
+                        if is_throttled(e):
+                            # Still throttled after the retries: tell the client to come back later.
+                            raise Overloaded(f"{self.name}: provider rate limit.", self.retry_base * 2 ** (attempt + 1)) from e
+                        raise
+                    attempt += 1
+                    self.stats["retries"] += 1
+                    # Full jitter keeps throttled callers from retrying in lockstep.
+                    delay = random.uniform(0, self.retry_base * 2 ** attempt)
+                    logger.warning("%s call failed (%s), retry %d/%d in %.2fs.",
+                                   self.name, e.__class__.__name__, attempt, self.max_retries, delay)
+                    await asyncio.sleep(delay)
+        finally:
+            self._release()
+
+    async def run(self, call: Callable[[], Awaitable[Any]], key: Optional[str] = None) -> Any:
+        """Runs `call()` under the scheduler; concurrent calls with the same `key` share the result."""
+        if key is None:
+            self.stats["calls"] += 1
+            return await self._execute(call)
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.stats["calls"] += 1
+            # The shared call runs in its own task so a caller that disconnects does not cancel it for the others.
+            task = asyncio.ensure_future(self._execute(call))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.stats["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved in case every caller went away.
+            task.exception()
+
+    def metrics(self) -> Dict[str, Any]:
+        waits = list(self._waits)
+        return {
+            **self.stats,
+            "queue_depth": self.waiting,
+            "running": self.running,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "wait_p50_ms": round(_percentile(waits, 50) * 1000, 1),
+            "wait_p95_ms": round(_percentile(waits, 95) * 1000, 1),
+            "wait_max_ms": round(max(waits, default=0.0) * 1000, 1),
+            "avg_call_ms": round(self._avg_duration * 1000, 1),
+            "estimated_wait_ms": round(self.estimated_wait() * 1000, 1),
+        }
+
+
+chat_scheduler = UpstreamScheduler("chat", LLM_MAX_CONCURRENCY)
+embedding_scheduler = UpstreamScheduler("embeddings", EMBEDDING_MAX_CONCURRENCY)
+
+
+async def invoke_model(llm, messages, name: str = "chat", **kwargs) -> Any:
+    """
+    `llm.ainvoke(messages)` through the chat scheduler, coalescing identical
+    prompts. `name` labels the call in the metrics (latency and token usage).
+    """
+    async def call():
+        with span("llm", name):
+            response = await llm.ainvoke(messages, **kwargs)
+        record_usage(name, response)
+        return response
+
+    return await chat_scheduler.run(call, key=prompt_key(llm, messages))
+
+
+async def embed_query(embeddings, text: str, name: str = "query"):
+    """`embeddings.aembed_query(text)` through the embeddings scheduler, coalescing identical texts."""
+    async def call():
+        with span("embedding", name):
+            return await embeddings.aembed_query(text)
+
+    return await embedding_scheduler.run(call, key=prompt_key(embeddings, text))
@@ -0,0 +1,133 @@
+import re
+import time
+from typing import Any, AsyncIterator, Dict, Tuple
+
+from api.core.telemetry import metrics
+from api.services.agent import graph_app
+
+GRAPH_NODES = {"route", "agent", "single", "tools", "responder"}
+# Nodes whose model output is the JSON answer
+ANSWER_NODES = {"single", "responder"}
+_REPLY_KEY = re.compile(r'"reply"\s*:\s*"')
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class ReplyStreamParser:
+    """
+    Incrementally extracts the value of the `reply` key from the JSON code block
+    that `generate_final_answer` asks the model for, so the text can be forwarded
+    to the client while the rest of the JSON is still being generated.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._state = "seek"
+
+    @property
+    def done(self) -> bool:
+        return self._state == "done"
+
+    def feed(self, chunk: str) -> str:
+        """Adds a chunk of raw model output and returns the newly decoded reply text."""
+        self._buffer += chunk
+        if self._state == "seek":
+            match = _REPLY_KEY.search(self._buffer)
+            if not match:
+                return ""
+            self._pos = match.end()
+            self._state = "string"
+        if self._state != "string":
+            return ""
+
+        out = []
+        buf = self._buffer
+        i = self._pos
+        while i < len(buf):
+            char = buf[i]
+            if char == '"':
+                self._state = "done"
+                i += 1
+                break
+            if char != "\\":
+                out.append(char)
+                i += 1
+                continue
+            # Escape sequence: wait for the rest of it if it was split across chunks.
+            if i + 1 >= len(buf):
+                break
+            code = buf[i + 1]
+            if code != "u":
+                out.append(_ESCAPES.get(code, code))
+                i += 2
+                continue
+            if i + 6 > len(buf):
+                break
+            codepoint = int(buf[i + 2:i + 6], 16)
+            if 0xD800 <= codepoint <= 0xDBFF:
+                # High surrogate: the low half comes in the next \uXXXX escape.
+                if i + 12 > len(buf):
+                    break
+                low = int(buf[i + 8:i + 12], 16)
+                codepoint = 0x10000 + ((codepoint - 0xD800) << 10) + (low - 0xDC00)
+                i += 12
+            else:
+                i += 6
+            out.append(chr(codepoint))
+        self._pos = i
+        return "".join(out)
+
+
+def _chunk_text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(
+            part if isinstance(part, str) else part.get("text", "")
+            for part in content
+            if isinstance(part, (str, dict))
+        )
+    return ""
+
+
+async def stream_graph(inputs: Dict[str, Any]) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Runs the graph and yields `(event, data)` pairs: node and tool progress,
+    `token` deltas of the reply as the responder generates it, and a final
+    `result` event with the parsed `generation` and the `tool_output` of the turn.
+    """
+    parsers = {}
+    generation = None
+    tool_output = None
+    route = "agent"
+    start = time.perf_counter()
+
+    async for event in graph_app.astream_events(inputs, version="v2"):
+        kind = event["event"]
+        name = event.get("name")
+        node = event.get("metadata", {}).get("langgraph_node")
+
+        if kind == "on_chain_start" and name in GRAPH_NODES and node == name:
+            yield "node", {"node": name}
+        elif kind == "on_tool_start":
+            yield "tool", {"tool": name, "status": "start"}
+        elif kind == "on_tool_end":
+            yield "tool", {"tool": name, "status": "end"}
+        elif kind == "on_chat_model_stream" and node in ANSWER_NODES:
+            parser = parsers.setdefault(node, ReplyStreamParser())
+            delta = parser.feed(_chunk_text(event["data"]["chunk"].content))
+            if delta:
+                yield "token", {"text": delta}
+        elif kind == "on_chain_end" and name in GRAPH_NODES and node == name:
+            output = event["data"].get("output")
+            if isinstance(output, dict) and output.get("generation"):
+                generation = output["generation"]
+            if isinstance(output, dict) and "tool_output" in output:
+                tool_output = output["tool_output"]
+            if isinstance(output, dict) and "route" in output:
+                route = output["route"]
+
+    path = route + ("+tools" if tool_output else "")
+    metrics.observe("graph", path, time.perf_counter() - start)
+
+    yield "result", {"generation": generation or {}, "tool_output": tool_output}
@@ -0,0 +1,128 @@
+import time
+import asyncio
+import logging
+import importlib
+from typing import Any, Dict, Optional
+
+from api.core.clients import get_chat_model, get_embeddings, get_firestore
+from api.core.telemetry import span
+from api.services.calendar_mirror import calendar_mirror
+from api.services.history import SESSIONS_COLLECTION
+from api.services.knowledge_base import knowledge_base
+
+logger = logging.getLogger(__name__)
+
+# Slow imports (langgraph, the graph's tools) that requests would otherwise pay for on first use.
+GRAPH_MODULES = ("api.services.agent", "api.services.streaming")
+RETRY_SECONDS = 30  # Delay before failed checks are retried
+
+
+def _import_graph():
+    for module in GRAPH_MODULES:
+        importlib.import_module(module)
+
+
+def _build_model_clients():
+    from api.services.agent import build_model_clients
+    build_model_clients()
+    get_chat_model(temperature=0)  # The summary (prompt_budget.py)
+    get_embeddings()
+
+
+async def _open_firestore():
+    db = await asyncio.to_thread(get_firestore)
+    if db is None:
+        raise RuntimeError("Firestore is not configured (FIREBASE_SERVICE_ACCOUNT_JSON).")
+    # One read opens the gRPC channel (DNS, TLS, auth token) before the first chat request needs it.
+    await db.collection(SESSIONS_COLLECTION).document("_warmup").get()
+
+
+async def _load_retriever():
+    await knowledge_base.ensure_loaded()
+    knowledge_base.start_watcher()
+
+
+class WarmUp:
+    """
+    Prepares everything a chat request needs in the background after startup, so
+    the server accepts connections (and answers /healthz) right away:
+
+    - graph:     imports the LangGraph graph, its nodes and tools.
+    - llm:       builds the Gemini chat and embeddings clients.
+    - firestore: builds the Firestore client and opens its channel with one read.
+    - retriever: loads (or builds) the knowledge base index and starts its watcher.
+
+    The checks run concurrently; failed ones are retried every RETRY_SECONDS.
+    /readyz reports ready once all of them have passed. Requests that arrive
+    earlier still work, paying for whatever is not warm yet.
+
+    The calendar mirror's refresher is started alongside, outside the checks:
+    the calendar is optional (without credentials its tools say so), so its
+    first sync runs in the background and never holds readiness back.
+    """
+
+    CHECKS = {
+        "graph": lambda: asyncio.to_thread(_import_graph),
+        "llm": lambda: asyncio.to_thread(_build_model_clients),
+        "firestore": _open_firestore,
+        "retriever": _load_retriever,
+    }
+
+    def __init__(self):
+        self.checks: Dict[str, Dict[str, Any]] = {
+            name: {"ready": False, "error": None, "duration_ms": None} for name in self.CHECKS
+        }
+        self.started_at: Optional[float] = None
+        self.ready_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return all(check["ready"] for check in self.checks.values())
+
+    async def _run_check(self, name: str):
+        start = time.perf_counter()
+        try:
+            with span("startup", name):
+                await self.CHECKS[name]()
+            self.checks[name].update(ready=True, error=None)
+        except Exception as e:
+            logger.error("Warm-up check '%s' failed: %s", name, e)
+            self.checks[name].update(ready=False, error=str(e))
+        finally:
+            self.checks[name]["duration_ms"] = round((time.perf_counter() - start) * 1000)
+
+    async def run(self):
+        self.started_at = time.time()
+        while True:
+            pending = [name for name, check in self.checks.items() if not check["ready"]]
+            await asyncio.gather(*(self._run_check(name) for name in pending))
+            if self.ready:
+                self.ready_at = time.time()
+                logger.info("Warm-up finished in %.1fs; ready.", self.ready_at - self.started_at)
+                return
+            await asyncio.sleep(RETRY_SECONDS)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+            calendar_mirror.start_refresher()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "warmup_seconds": round(self.ready_at - self.started_at, 2) if self.ready_at else None,
+            "checks": self.checks,
+        }
+
+
+warmup = WarmUp()
@@ -0,0 +1,293 @@
+import time
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.api_core.exceptions import Conflict
+
+from api.core.config import (
+    HISTORY_WINDOW,
+    WRITE_BEHIND_ENABLED,
+    WRITE_BEHIND_FLUSH_INTERVAL_SECONDS,
+    WRITE_BEHIND_MAX_PENDING_WRITES,
+    WRITE_BEHIND_MAX_RETRIES,
+)
+from api.core.telemetry import metrics, span
+from api.services.history import MAX_BATCH_WRITES, add_turns, append_turns, load_session
+
+logger = logging.getLogger(__name__)
+
+MAX_BACKOFF_SECONDS = 30
+# Written turns stay in the overlay this long, for reads of the session that started before the commit.
+RECENT_WRITES_SECONDS = 10
+
+
+class _SessionWrites:
+    """Turns of one session waiting to be written, in sequence order, plus the latest session fields."""
+
+    def __init__(self, db):
+        self.db = db
+        self.turns: List[Tuple[int, str, str]] = []  # (seq, role, content)
+        self.fields: Dict[str, Any] = {}
+
+    @property
+    def write_count(self) -> int:
+        return len(self.turns) + 1  # The turn documents plus the session document
+
+    def extend(self, newer: "_SessionWrites"):
+        self.turns.extend(newer.turns)
+        self.fields.update(newer.fields)
+
+    def shift(self, delta: int):
+        self.turns = [(seq + delta, role, content) for seq, role, content in self.turns]
+
+
+class TurnWriter:
+    """
+    Write-behind persistence of chat turns. `append` queues the turns of a reply
+    and returns at once; a background task writes everything queued in a few
+    Firestore batch commits every `flush_interval` seconds, or as soon as
+    `max_pending` writes are waiting.
+
+    - Turns of a session are committed in sequence order: there is a single
+      flusher, and a failed commit puts its turns back ahead of newer ones.
+    - A sequence conflict (another worker appended to the same session) falls
+      back to history.append_turns for the sessions in that batch, which
+      re-sequences after the stored tail.
+    - `load_session` overlays the turns this worker has not written yet, so the
+      next request of a session sees its previous reply.
+    - `drain` flushes what is left on shutdown.
+    """
+
+    def __init__(self, enabled: bool = WRITE_BEHIND_ENABLED,
+                 flush_interval: float = WRITE_BEHIND_FLUSH_INTERVAL_SECONDS,
+                 max_pending: int = WRITE_BEHIND_MAX_PENDING_WRITES,
+                 max_retries: int = WRITE_BEHIND_MAX_RETRIES):
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self._pending: Dict[str, _SessionWrites] = {}
+        self._inflight: Dict[str, _SessionWrites] = {}
+        self._recent: Dict[str, Tuple[float, _SessionWrites]] = {}
+        self._tails: Dict[str, int] = {}  # Next sequence number of sessions with unwritten or recent turns
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+        self._failures = 0
+        self.stats = {"turns": 0, "commits": 0, "writes": 0, "conflicts": 0, "failed_commits": 0, "dropped_turns": 0}
+
+    @property
+    def pending_writes(self) -> int:
+        return sum(writes.write_count for writes in self._pending.values())
+
+    async def append(self, db, session_id: str, next_seq: int, turns: List[tuple],
+                     session_fields: Optional[Dict[str, Any]] = None) -> int:
+        """Queues (role, content) turns starting at `next_seq`; returns the new next sequence number."""
+        if not self.enabled:
+            return await append_turns(db, session_id, next_seq, turns, session_fields)
+
+        # A request that loaded the session before an earlier reply was queued continues after it.
+        seq = max(next_seq, self._tails.get(session_id, 0))
+        writes = self._pending.get(session_id)
+        if writes is None:
+            writes = self._pending[session_id] = _SessionWrites(db)
+        for offset, (role, content) in enumerate(turns):
+            writes.turns.append((seq + offset, role, content))
+        writes.fields.update(session_fields or {})
+        self._tails[session_id] = seq + len(turns)
+        self.stats["turns"] += len(turns)
+
+        self._ensure_flusher()
+        if self.pending_writes >= self.max_pending:
+            self._wake.set()
+        return self._tails[session_id]
+
+    async def load_session(self, db, session_id: str, window: int = HISTORY_WINDOW) -> Dict[str, Any]:
+        """history.load_session plus the turns of the session this worker has not written yet."""
+        session = await load_session(db, session_id, window)
+        return self._overlay(session_id, session, window)
+
+    def _overlay(self, session_id: str, session: Dict[str, Any], window: int) -> Dict[str, Any]:
+        recent = self._recent.get(session_id)
+        unwritten = [
+            writes for writes in (recent and recent[1], self._inflight.get(session_id), self._pending.get(session_id))
+            if writes
+        ]
+        if not unwritten:
+            return session
+        # Turns Firestore returned (a commit that finished during the read) are not repeated, nor are
+        # turns of a failed commit that are both in flight and queued again. A turn whose seq another
+        # worker already used is still shown: it is this worker's, waiting to be re-sequenced.
+        stored = {session["first_seq"] + offset: turn for offset, turn in enumerate(session["history"])}
+        by_seq = {
+            turn[0]: turn for writes in unwritten for turn in writes.turns
+            if turn[0] >= session["first_seq"] and stored.get(turn[0]) != (turn[1], turn[2])
+        }
+        turns = [by_seq[seq] for seq in sorted(by_seq)]
+        history = list(session["history"]) + [(role, content) for _, role, content in turns]
+        first_seq = session["first_seq"] if session["history"] else (turns[0][0] if turns else session["first_seq"])
+        if len(history) > window:
+            first_seq += len(history) - window
+            history = history[-window:]
+        form_data = session["form_data"]
+        for writes in unwritten:
+            form_data = writes.fields.get("form_data", form_data)
+        return {
+            **session,
+            "history": history,
+            "first_seq": first_seq,
+            "next_seq": max(session["next_seq"], self._tails.get(session_id, 0)),
+            "form_data": form_data,
+        }
+
+    def _ensure_flusher(self):
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            # Back off after failed commits so an unavailable Firestore is not hammered.
+            delay = min(MAX_BACKOFF_SECONDS, self.flush_interval * 2 ** self._failures)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Write-behind flush failed.")
+
+    def _batches(self, sessions: Dict[str, _SessionWrites]):
+        """Groups sessions into batches of at most MAX_BATCH_WRITES writes, never splitting a session."""
+        group, size = [], 0
+        for session_id, writes in sessions.items():
+            if group and size + writes.write_count > MAX_BATCH_WRITES:
+                yield group
+                group, size = [], 0
+            group.append((session_id, writes))
+            size += writes.write_count
+        if group:
+            yield group
+
+    async def flush(self) -> bool:
+        """Writes everything queued so far. Returns False if some turns had to be queued again."""
+        async with self._flush_lock:
+            self._prune_recent()
+            if not self._pending:
+                return True
+            self._inflight, self._pending = self._pending, {}
+            ok = True
+            for group in list(self._batches(self._inflight)):
+                ok = await self._commit(group) and ok
+            self._inflight = {}
+            self._failures = 0 if ok else self._failures + 1
+            return ok
+
+    async def _commit(self, group: List[Tuple[str, _SessionWrites]]) -> bool:
+        db = group[0][1].db
+        batch = db.batch()
+        writes_count = 0
+        for session_id, writes in group:
+            writes_count += add_turns(batch, db, session_id, writes.turns[0][0],
+                                      [(role, content) for _, role, content in writes.turns], writes.fields)
+        try:
+            with span("firestore", "write_behind_commit"):
+                await batch.commit()
+        except Conflict:
+            self.stats["conflicts"] += 1
+            logger.warning("Sequence conflict in a write-behind batch; appending its %d sessions one by one.", len(group))
+            return all([await self._append_session(session_id, writes) for session_id, writes in group])
+        except Exception as e:
+            self.stats["failed_commits"] += 1
+            logger.warning("Write-behind commit of %d writes failed (%s); queued again.", writes_count, e)
+            for session_id, writes in group:
+                self._requeue(session_id, writes)
+            return False
+        self.stats["commits"] += 1
+        self.stats["writes"] += writes_count
+        for session_id, writes in group:
+            self._written(session_id, writes)
+        return True
+
+    async def _append_session(self, session_id: str, writes: _SessionWrites) -> bool:
+        first_seq = writes.turns[0][0]
+        try:
+            tail = await append_turns(writes.db, session_id, first_seq,
+                                      [(role, content) for _, role, content in writes.turns], writes.fields)
+        except Exception as e:
+            self.stats["failed_commits"] += 1
+            logger.warning("Write-behind append to session %s failed (%s); queued again.", session_id, e)
+            self._requeue(session_id, writes)
+            return False
+        self.stats["commits"] += 1
+        self.stats["writes"] += writes.write_count
+        shift = tail - (first_seq + len(writes.turns))
+        if shift:
+            # The turns were re-sequenced after the stored tail; move the newer ones along with them.
+            writes.shift(shift)
+            newer = self._pending.get(session_id)
+            if newer:
+                newer.shift(shift)
+            self._tails[session_id] = self._tails.get(session_id, tail) + shift
+        self._written(session_id, writes)
+        return True
+
+    def _requeue(self, session_id: str, writes: _SessionWrites):
+        newer = self._pending.get(session_id)
+        if newer is not None:
+            writes.extend(newer)
+        self._pending[session_id] = writes
+        # Keep the failed session first so its turns go out before newer sessions' in the next flush.
+        self._pending = {session_id: self._pending.pop(session_id), **self._pending}
+
+    def _written(self, session_id: str, writes: _SessionWrites):
+        recent = self._recent.get(session_id)
+        if recent is not None:
+            recent[1].extend(writes)
+            writes = recent[1]
+        writes.turns = writes.turns[-HISTORY_WINDOW:]
+        self._recent[session_id] = (time.monotonic(), writes)
+
+    def _prune_recent(self):
+        cutoff = time.monotonic() - RECENT_WRITES_SECONDS
+        for session_id, (written_at, _) in list(self._recent.items()):
+            if written_at < cutoff:
+                del self._recent[session_id]
+                if session_id not in self._pending and session_id not in self._inflight:
+                    self._tails.pop(session_id, None)
+
+    async def drain(self):
+        """Stops the background flusher and writes everything still queued (used on shutdown)."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        start = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            if await self.flush():
+                break
+            await asyncio.sleep(min(MAX_BACKOFF_SECONDS, self.flush_interval * 2 ** attempt))
+        if self._pending:
+            lost = sum(len(writes.turns) for writes in self._pending.values())
+            self.stats["dropped_turns"] += lost
+            logger.error("Write-behind drain gave up: %d turns of %d sessions were not saved.", lost, len(self._pending))
+            self._pending = {}
+            self._tails = {}
+        metrics.observe("firestore", "write_behind_drain", time.perf_counter() - start)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "pending_sessions": len(self._pending),
+            "pending_writes": self.pending_writes,
+            "consecutive_failures": self._failures,
+        }
+
+
+turn_writer = TurnWriter()
@@ -0,0 +1,383 @@
+"""
+Deterministic local stand-ins for the external services, used by the offline
+load test (bench/load_test.py):
+
+- FakeChatModel:       Gemini chat model with configurable latency. Plans tool
+                       calls from keywords and answers with the JSON the
+                       responder prompt asks for.
+- FakeEmbeddings:      hash-based embeddings with configurable latency.
+- InMemoryFirestore:   the subset of the async Firestore client used by
+                       api/services/history.py (documents, subcollections,
+                       order_by/limit queries and batches with create()).
+- FakeCalendarService: events().list() with paging and sync tokens.
+
+`install` plugs them in through api.core.clients.override_clients, so the
+graph, the `get_db` dependency and the calendar tools use them unchanged.
+"""
+import re
+import copy
+import json
+import time
+import uuid
+import random
+import asyncio
+import hashlib
+import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from google.api_core.exceptions import AlreadyExists
+from google.cloud import firestore as google_firestore
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.]+")
+_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+_SEARCH_HINTS = ("precio", "cuest", "servici", "boda", "cumple", "comuni", "corporativ", "empresa", "decoraci", "catering", "flor")
+_CALENDAR_HINTS = ("disponib", "libre", "semana", "mes", "fecha")
+
+
+def _stable_random(*parts) -> random.Random:
+    """A random generator seeded from `parts`, so the same prompt always behaves the same."""
+    seed = hashlib.sha256("|".join(str(part) for part in parts).encode("utf-8")).digest()
+    return random.Random(int.from_bytes(seed[:8], "big"))
+
+
+def _jittered(latency: float, jitter: float, *parts) -> float:
+    return max(0.0, latency * (1 + _stable_random(*parts).uniform(-jitter, jitter)))
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model stand-in. Accepts (and ignores) the ChatGoogleGenerativeAI keyword arguments."""
+
+    model: str = "fake"
+    temperature: float = 0
+    max_retries: int = 0
+    latency: float = 0.5
+    jitter: float = 0.2
+    seed: int = 0
+    tool_names: Sequence[str] = ()
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.model_copy(update={"tool_names": tuple(tool.name for tool in tools)})
+
+    def _question(self, messages) -> str:
+        users = [message.content for message in messages if message.type == "human"]
+        return users[-1] if users else ""
+
+    def _plan_tools(self, messages) -> List[Dict[str, Any]]:
+        if any(message.type == "system" and message.content.startswith("Tools used") for message in messages):
+            return []
+        question = self._question(messages)
+        text = question.lower()
+        calls = []
+        date = _DATE.search(question)
+        if date and "check_date_availability" in self.tool_names:
+            calls.append(("check_date_availability", {"date": date.group(0)}))
+        elif any(hint in text for hint in _CALENDAR_HINTS) and "get_calendar_events" in self.tool_names:
+            calls.append(("get_calendar_events", {"days_from_now": 30}))
+        if any(hint in text for hint in _SEARCH_HINTS) and "search_event_info" in self.tool_names:
+            calls.append(("search_event_info", {"query": question}))
+        return [{"name": name, "args": args, "id": f"call_{index}"} for index, (name, args) in enumerate(calls)]
+
+    def _reply(self, messages) -> AIMessage:
+        if self.tool_names:
+            tool_calls = self._plan_tools(messages)
+            # The agent node only plans tools; in single-call mode the same call may answer directly.
+            if tool_calls or not self._answers_directly(messages):
+                return AIMessage(content="", tool_calls=tool_calls)
+        if messages and messages[0].type == "system" and "running summary" in messages[0].content:
+            return AIMessage(content=f"Resumen: {self._question(messages)[:200]}")
+        question = self._question(messages)
+        email = _EMAIL.search(question)
+        reply = {
+            "reply": f"Gracias por tu mensaje. Sobre \"{question[:60]}\": te ayudamos encantados con tu evento.",
+            "formData": {"email": email.group(0)} if email else {},
+        }
+        return AIMessage(content=f"```json\n{json.dumps(reply, ensure_ascii=False)}\n```")
+
+    @staticmethod
+    def _answers_directly(messages) -> bool:
+        # In single-call mode the tool-enabled call may answer with the final JSON itself.
+        return any(message.type == "system" and "**Tools:**" in message.content for message in messages)
+
+    def _with_usage(self, message: AIMessage, messages) -> AIMessage:
+        prompt_tokens = sum(len(str(m.content)) for m in messages) // 4
+        completion_tokens = len(str(message.content)) // 4 + 10 * len(message.tool_calls)
+        message.usage_metadata = {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        return message
+
+    def _delay(self, messages) -> float:
+        return _jittered(self.latency, self.jitter, self.seed, self._question(messages), len(messages), self.tool_names)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self._delay(messages))
+        return ChatResult(generations=[ChatGeneration(message=self._with_usage(self._reply(messages), messages))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self._delay(messages))
+        return ChatResult(generations=[ChatGeneration(message=self._with_usage(self._reply(messages), messages))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        message = self._with_usage(self._reply(messages), messages)
+        delay = self._delay(messages)
+        if message.tool_calls:
+            await asyncio.sleep(delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content="",
+                tool_call_chunks=[
+                    {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": index}
+                    for index, call in enumerate(message.tool_calls)
+                ],
+                usage_metadata=message.usage_metadata,
+            ))
+            return
+        # Half the latency before the first token, the rest spread over the chunks.
+        content = message.content or " "
+        pieces = [content[i:i + 16] for i in range(0, len(content), 16)]
+        await asyncio.sleep(delay / 2)
+        for index, piece in enumerate(pieces):
+            await asyncio.sleep(delay / 2 / len(pieces))
+            usage = message.usage_metadata if index == len(pieces) - 1 else None
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece, usage_metadata=usage))
+
+
+class FakeEmbeddings(Embeddings):
+    """Unit vectors derived from a hash of the text; identical texts get identical vectors."""
+
+    def __init__(self, model: str = "fake", size: int = 256, latency: float = 0.05, jitter: float = 0.2, **kwargs):
+        self.model = model
+        self.size = size
+        self.latency = latency
+        self.jitter = jitter
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+        vector = np.random.default_rng(seed).normal(size=self.size)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(_jittered(self.latency, self.jitter, text))
+        return self._vector(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(_jittered(self.latency, self.jitter, text))
+        return self._vector(text)
+
+
+def _resolve(data: Dict[str, Any], existing: Dict[str, Any]) -> Dict[str, Any]:
+    merged = dict(existing)
+    for key, value in data.items():
+        if value is google_firestore.DELETE_FIELD:
+            merged.pop(key, None)
+        elif value is google_firestore.SERVER_TIMESTAMP:
+            merged[key] = datetime.datetime.now(datetime.timezone.utc)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
+class _Snapshot:
+    def __init__(self, doc_id: str, data: Optional[Dict[str, Any]]):
+        self.id = doc_id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+
+class _DocumentReference:
+    def __init__(self, store: "InMemoryFirestore", path: str):
+        self._store = store
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def collection(self, name: str) -> "_CollectionReference":
+        return _CollectionReference(self._store, f"{self.path}/{name}")
+
+    async def get(self) -> _Snapshot:
+        await self._store.round_trip(reads=1)
+        return _Snapshot(self.id, self._store.docs.get(self.path))
+
+    async def set(self, data: Dict[str, Any], merge: bool = False):
+        await self._store.round_trip(writes=1)
+        self._store.write(self.path, data, merge)
+
+
+class _Query:
+    def __init__(self, collection: "_CollectionReference", order: Optional[str] = None,
+                 descending: bool = False, limit: Optional[int] = None):
+        self._collection = collection
+        self._order = order
+        self._descending = descending
+        self._limit = limit
+
+    def order_by(self, field: str, direction: str = "ASCENDING") -> "_Query":
+        return _Query(self._collection, field, direction == "DESCENDING", self._limit)
+
+    def limit(self, count: int) -> "_Query":
+        return _Query(self._collection, self._order, self._descending, count)
+
+    def _snapshots(self) -> List[_Snapshot]:
+        prefix = self._collection.path + "/"
+        docs = [(path, data) for path, data in self._collection.store.docs.items()
+                if path.startswith(prefix) and "/" not in path[len(prefix):]]
+        if self._order:
+            docs.sort(key=lambda item: item[1].get(self._order), reverse=self._descending)
+        if self._limit is not None:
+            docs = docs[:self._limit]
+        return [_Snapshot(path.rsplit("/", 1)[-1], copy.deepcopy(data)) for path, data in docs]
+
+    async def get(self) -> List[_Snapshot]:
+        snapshots = self._snapshots()
+        await self._collection.store.round_trip(reads=max(1, len(snapshots)))
+        return snapshots
+
+    async def stream(self):
+        snapshots = self._snapshots()
+        await self._collection.store.round_trip(reads=max(1, len(snapshots)))
+        for snapshot in snapshots:
+            yield snapshot
+
+
+class _CollectionReference(_Query):
+    def __init__(self, store: "InMemoryFirestore", path: str):
+        self.store = store
+        self.path = path
+        super().__init__(self)
+
+    def document(self, doc_id: Optional[str] = None) -> _DocumentReference:
+        return _DocumentReference(self.store, f"{self.path}/{doc_id or uuid.uuid4().hex[:20]}")
+
+
+class _WriteBatch:
+    def __init__(self, store: "InMemoryFirestore"):
+        self._store = store
+        self._ops = []
+
+    def set(self, ref: _DocumentReference, data: Dict[str, Any], merge: bool = False):
+        self._ops.append(("set", ref.path, data, merge))
+
+    def create(self, ref: _DocumentReference, data: Dict[str, Any]):
+        self._ops.append(("create", ref.path, data, False))
+
+    async def commit(self):
+        await self._store.round_trip(writes=len(self._ops))
+        # All-or-nothing, like Firestore: a create() on an existing document fails the whole batch.
+        for op, path, _, _ in self._ops:
+            if op == "create" and path in self._store.docs:
+                raise AlreadyExists(f"Document already exists: {path}")
+        for _, path, data, merge in self._ops:
+            self._store.write(path, data, merge)
+        self._store.stats["commits"] += 1
+
+
+class InMemoryFirestore:
+    """In-memory replacement for google.cloud.firestore.AsyncClient with a fixed per-round-trip latency."""
+
+    def __init__(self, latency: float = 0.01):
+        self.latency = latency
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self.stats = {"round_trips": 0, "reads": 0, "writes": 0, "commits": 0}
+
+    async def round_trip(self, reads: int = 0, writes: int = 0):
+        self.stats["round_trips"] += 1
+        self.stats["reads"] += reads
+        self.stats["writes"] += writes
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def write(self, path: str, data: Dict[str, Any], merge: bool):
+        self.docs[path] = _resolve(data, self.docs.get(path, {}) if merge else {})
+
+    def collection(self, name: str) -> _CollectionReference:
+        return _CollectionReference(self, name)
+
+    def batch(self) -> _WriteBatch:
+        return _WriteBatch(self)
+
+
+class _Request:
+    def __init__(self, service: "FakeCalendarService", params: Dict[str, Any]):
+        self._service = service
+        self._params = params
+
+    def execute(self) -> Dict[str, Any]:
+        return self._service.list_events(self._params)
+
+
+class FakeCalendarService:
+    """
+    Stand-in for the Calendar API service object. Holds `days` days of
+    deterministic bookings; the first list() pages through all of them and
+    returns a sync token, later list() calls with that token return no changes.
+    Blocking like the real client (the mirror calls it from a worker thread).
+    """
+
+    def __init__(self, latency: float = 0.1, days: int = 365, seed: int = 0, page_size: int = 100):
+        self.latency = latency
+        self.page_size = page_size
+        self.calls = 0
+        rng = random.Random(seed)
+        today = datetime.date.today()
+        self._events = []
+        for offset in range(days):
+            if rng.random() < 0.3:
+                day = today + datetime.timedelta(days=offset)
+                self._events.append({
+                    "id": f"evt{offset}",
+                    "status": "confirmed",
+                    "summary": rng.choice(["Boda", "Cumpleaños", "Evento corporativo", "Comunión"]),
+                    "start": {"date": day.isoformat()},
+                    "end": {"date": (day + datetime.timedelta(days=1)).isoformat()},
+                })
+
+    def events(self):
+        return self
+
+    def list(self, **params) -> _Request:
+        return _Request(self, params)
+
+    def list_events(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        self.calls += 1
+        time.sleep(self.latency)
+        if params.get("syncToken"):
+            return {"items": [], "nextSyncToken": params["syncToken"]}
+        start = int(params.get("pageToken") or 0)
+        page = self._events[start:start + self.page_size]
+        result = {"items": copy.deepcopy(page)}
+        if start + self.page_size < len(self._events):
+            result["nextPageToken"] = str(start + self.page_size)
+        else:
+            result["nextSyncToken"] = "sync-1"
+        return result
+
+
+def install(chat_latency: float = 0.5, embedding_latency: float = 0.05, firestore_latency: float = 0.01,
+            calendar_latency: float = 0.1, seed: int = 0) -> Dict[str, Any]:
+    """Plugs the fakes into api.core.clients and returns them (for their stats)."""
+    from api.core.clients import override_clients
+
+    firestore = InMemoryFirestore(latency=firestore_latency)
+    calendar = FakeCalendarService(latency=calendar_latency, seed=seed)
+    override_clients(
+        chat_model=lambda **kwargs: FakeChatModel(latency=chat_latency, seed=seed, **kwargs),
+        embeddings=lambda **kwargs: FakeEmbeddings(latency=embedding_latency, **kwargs),
+        firestore=firestore,
+        calendar_service=calendar,
+    )
+    return {"firestore": firestore, "calendar": calendar}
@@ -0,0 +1,102 @@
+"""
+Import-time profile of the app: runs `python -X importtime -c "import api.main"`
+in a fresh interpreter and reports the total and the slowest modules and
+top-level packages, so startup cost can be tracked from commit to commit.
+
+    python -m bench.import_profile                       # table of the slowest imports
+    python -m bench.import_profile --history imports.ndjson
+    python -m bench.import_profile --budget-ms 1500      # exit 1 if importing takes longer
+
+`--history` appends one JSON line per run (timestamp, git commit, totals and
+the top packages). The numbers include the interpreter's own start-up noise;
+compare medians of a few `--runs` on the same machine.
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from collections import defaultdict
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def profile_imports(module: str):
+    """Returns [(module, self_us, cumulative_us, depth)] for one cold import of `module`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    entries = []
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return entries
+
+
+def summarize(entries, module: str, top: int):
+    total_us = next((cumulative for name, _, cumulative, depth in entries if name == module and depth == 0), 0)
+    packages = defaultdict(int)
+    for name, self_us, _, _ in entries:
+        packages[name.split(".")[0]] += self_us
+    slowest = sorted(entries, key=lambda entry: entry[1], reverse=True)[:top]
+    return {
+        "module": module,
+        "total_ms": round(total_us / 1000, 1),
+        "modules_imported": len(entries),
+        "packages_ms": {name: round(us / 1000, 1) for name, us in sorted(packages.items(), key=lambda item: -item[1])[:top]},
+        "slowest_modules_ms": {name: round(self_us / 1000, 1) for name, self_us, _, _ in slowest},
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Report the import time of the app, by module and package.")
+    parser.add_argument("--module", default="api.main", help="Module to import (default: api.main).")
+    parser.add_argument("--runs", type=int, default=3, help="Cold imports to run; the median one is reported.")
+    parser.add_argument("--top", type=int, default=15, help="Number of packages and modules listed.")
+    parser.add_argument("--history", metavar="PATH", help="Append the report as a JSON line to this file.")
+    parser.add_argument("--budget-ms", type=float, help="Exit with status 1 if the import takes longer than this.")
+    args = parser.parse_args(argv)
+
+    reports = [summarize(profile_imports(args.module), args.module, args.top) for _ in range(args.runs)]
+    report = sorted(reports, key=lambda item: item["total_ms"])[len(reports) // 2]
+    report["runs_total_ms"] = [item["total_ms"] for item in reports]
+
+    print(f"import {report['module']}: {report['total_ms']} ms (median of {args.runs}: "
+          f"{', '.join(str(ms) for ms in report['runs_total_ms'])}; stdev "
+          f"{statistics.pstdev(report['runs_total_ms']):.1f}), {report['modules_imported']} modules")
+    print(f"\n{'package':<40} {'self_ms':>9}")
+    for name, ms in report["packages_ms"].items():
+        print(f"{name:<40} {ms:>9.1f}")
+    print(f"\n{'module':<60} {'self_ms':>9}")
+    for name, ms in report["slowest_modules_ms"].items():
+        print(f"{name:<60} {ms:>9.1f}")
+
+    if args.history:
+        with open(args.history, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": _git_commit(), **report}) + "\n")
+
+    if args.budget_ms is not None and report["total_ms"] > args.budget_ms:
+        print(f"\nImport time {report['total_ms']} ms exceeds the budget of {args.budget_ms} ms.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""
+Offline load test of the chat API. Replays the multi-turn conversations in
+bench/conversations.json against the FastAPI app in-process, with the
+deterministic stand-ins from bench/fakes.py in place of Gemini, Firestore and
+Google Calendar, so no quota is spent and runs are reproducible.
+
+    python -m bench.load_test                          # 50 sessions, 10 at a time
+    python -m bench.load_test -c 32 -n 200 --stream    # /chatbot/stream instead of /chatbot
+    python -m bench.load_test --chat-latency 1.5 --json results.json
+
+Turns of one session are sent one after another (each waits for the previous
+reply, like a user would); `--concurrency` sessions run at once. Reports
+requests/sec, end-to-end latency percentiles, status codes and the per-stage
+breakdown recorded by api.core.telemetry (graph nodes, LLM calls, tools,
+Firestore, queue waits). Compare runs on the same machine with the same flags.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from collections import Counter
+
+CONVERSATIONS_PATH = os.path.join(os.path.dirname(__file__), "conversations.json")
+API_KEY = "load-test"
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _configure_environment(args):
+    # Must run before the first `api` import: the settings are read at import time.
+    os.environ["BACKEND_API_KEY"] = API_KEY
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    # Fake vectors must never end up in the real index cache.
+    os.environ["INDEX_CACHE_DIR"] = tempfile.mkdtemp(prefix="nonaeventos-bench-")
+    os.environ["KNOWLEDGE_WATCH_INTERVAL_SECONDS"] = "0"
+    os.environ["CALENDAR_SYNC_INTERVAL_SECONDS"] = "0"
+    os.environ["ANSWER_CACHE_ENABLED"] = "false" if args.no_answer_cache else "true"
+    if args.routing:
+        os.environ["ROUTING_MODE"] = args.routing
+
+
+async def _send(client, path, message, session_id):
+    payload = {"message": message, "session_id": session_id}
+    headers = {"X-API-Key": API_KEY}
+    if path.endswith("/stream"):
+        response = await client.post(path, json=payload, headers=headers)
+        if response.status_code != 200:
+            return response.status_code, session_id
+        event = None
+        for line in response.text.splitlines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: ") and event in ("done", "error"):
+                data = json.loads(line[len("data: "):])
+                return (200, data["session_id"]) if event == "done" else ("stream_error", session_id)
+        return "stream_error", session_id
+    response = await client.post(path, json=payload, headers=headers)
+    if response.status_code != 200:
+        return response.status_code, session_id
+    return 200, response.json()["session_id"]
+
+
+async def _replay(client, path, conversation, latencies, statuses):
+    session_id = None
+    for message in conversation["turns"]:
+        start = time.perf_counter()
+        try:
+            status, session_id = await _send(client, path, message, session_id)
+        except Exception as e:
+            status = e.__class__.__name__
+        latencies.append(time.perf_counter() - start)
+        statuses[str(status)] += 1
+        if status != 200:
+            # The rest of the conversation depends on this turn; abandon the session.
+            return
+
+
+async def run_load(args, conversations):
+    import httpx
+    from api.main import app
+    from api.core.telemetry import metrics
+    from api.services.scheduler import chat_scheduler, embedding_scheduler
+    from api.services.warmup import warmup
+    from api.services.write_behind import turn_writer
+
+    # Same warm-up as the server's startup, so the first requests do not pay for imports and the index.
+    await warmup.run()
+    metrics.reset()
+    latencies, statuses = [], Counter()
+    sessions = asyncio.Queue()
+    for index in range(args.sessions):
+        sessions.put_nowait(conversations[index % len(conversations)])
+
+    path = "/api/chatbot/stream" if args.stream else "/api/chatbot"
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def worker():
+            while not sessions.empty():
+                await _replay(client, path, sessions.get_nowait(), latencies, statuses)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+    # Write the queued turns so the Firestore numbers cover the whole run.
+    await turn_writer.drain()
+
+    return {
+        "endpoint": path,
+        "sessions": args.sessions,
+        "concurrency": args.concurrency,
+        "requests": len(latencies),
+        "duration_s": round(elapsed, 2),
+        "requests_per_s": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {f"p{pct}": round(_percentile(latencies, pct) * 1000, 1) for pct in (50, 95, 99)},
+        "status": dict(sorted(statuses.items())),
+        "stages": metrics.snapshot(),
+        "schedulers": {"chat": chat_scheduler.metrics(), "embeddings": embedding_scheduler.metrics()},
+        "write_behind": turn_writer.status(),
+    }
+
+
+def _print_report(report, fakes):
+    print(f"{report['requests']} requests to {report['endpoint']} ({report['sessions']} sessions, "
+          f"concurrency {report['concurrency']}) in {report['duration_s']}s: {report['requests_per_s']} req/s")
+    latency = report["latency_ms"]
+    print(f"latency p50 {latency['p50']} ms, p95 {latency['p95']} ms, p99 {latency['p99']} ms")
+    print("status " + ", ".join(f"{status}: {count}" for status, count in report["status"].items()))
+    print(f"firestore round trips {fakes['firestore'].stats['round_trips']}, calendar calls {fakes['calendar'].calls}")
+    print()
+    print(f"{'stage':<40} {'count':>7} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9}")
+    for stage, stats in report["stages"].items():
+        print(f"{stage:<40} {stats['count']:>7} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay multi-turn conversations against the chat API with local fakes.")
+    parser.add_argument("-c", "--concurrency", type=int, default=10, help="Sessions running at the same time.")
+    parser.add_argument("-n", "--sessions", type=int, default=50, help="Conversations to replay in total.")
+    parser.add_argument("--stream", action="store_true", help="Use /chatbot/stream instead of /chatbot.")
+    parser.add_argument("--routing", choices=("planner", "classifier", "single"), help="Override ROUTING_MODE.")
+    parser.add_argument("--no-answer-cache", action="store_true", help="Disable the semantic answer cache.")
+    parser.add_argument("--chat-latency", type=float, default=0.5, help="Seconds per fake chat model call.")
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="Seconds per fake query embedding.")
+    parser.add_argument("--firestore-latency", type=float, default=0.01, help="Seconds per fake Firestore round trip.")
+    parser.add_argument("--calendar-latency", type=float, default=0.1, help="Seconds per fake Calendar API page.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", metavar="PATH", help="Also write the full report as JSON.")
+    args = parser.parse_args(argv)
+
+    _configure_environment(args)
+    from bench import fakes
+    from api.core.telemetry import configure_logging
+
+    configure_logging()
+    installed = fakes.install(
+        chat_latency=args.chat_latency,
+        embedding_latency=args.embedding_latency,
+        firestore_latency=args.firestore_latency,
+        calendar_latency=args.calendar_latency,
+        seed=args.seed,
+    )
+
+    with open(CONVERSATIONS_PATH, encoding="utf-8") as f:
+        conversations = json.load(f)
+
+    report = asyncio.run(run_load(args, conversations))
+    _print_report(report, installed)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0 if set(report["status"]) == {"200"} else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
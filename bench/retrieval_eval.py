@@ -0,0 +1,78 @@
+"""
+Measures retrieval quality and latency of the knowledge base retrievers on the
+fixed query set in bench/retrieval_queries.json.
+
+    python -m bench.retrieval_eval            # real Gemini embeddings (needs GOOGLE_API_KEY)
+    python -m bench.retrieval_eval --offline  # deterministic fake embeddings, no network
+
+A query counts as a hit when one of the top-k chunks contains its `expected`
+text. Dense quality is meaningless with --offline; use it to check BM25 and
+the latency/embedding-call numbers.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+
+QUERIES_PATH = os.path.join(os.path.dirname(__file__), "retrieval_queries.json")
+MODES = ("bm25", "dense", "hybrid", None)
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def evaluate(retriever, queries, mode):
+    hits, reciprocal_ranks, latencies = 0, [], []
+    for item in queries:
+        start = time.perf_counter()
+        docs = await retriever.ainvoke(item["query"], mode=mode)
+        latencies.append((time.perf_counter() - start) * 1000)
+        rank = next((i + 1 for i, doc in enumerate(docs) if item["expected"].lower() in doc.page_content.lower()), None)
+        hits += rank is not None
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+    return {
+        "hit@k": hits / len(queries),
+        "mrr": statistics.mean(reciprocal_ranks),
+        "p50_ms": _percentile(latencies, 50),
+        "p95_ms": _percentile(latencies, 95),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Evaluate BM25, dense and hybrid retrieval on a fixed query set.")
+    parser.add_argument("--offline", action="store_true", help="Use deterministic fake embeddings instead of the Gemini API.")
+    parser.add_argument("-k", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    from api.services import knowledge
+    from api.services.hybrid_retriever import HybridRetriever
+
+    if args.offline:
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        from langchain_community.vectorstores import FAISS
+        embeddings = DeterministicFakeEmbedding(size=256)
+        vectorstore = FAISS.from_documents(knowledge.load_chunks(), embeddings)
+    else:
+        vectorstore, _ = knowledge.load_vectorstore()
+
+    with open(QUERIES_PATH, encoding="utf-8") as f:
+        queries = json.load(f)
+
+    print(f"{len(queries)} queries, k={args.k}")
+    print(f"{'mode':<10} {'hit@k':>6} {'mrr':>6} {'p50_ms':>8} {'p95_ms':>8} {'embed_calls':>12}")
+    for mode in MODES:
+        # A fresh retriever per mode so the query-embedding cache starts cold.
+        retriever = HybridRetriever(vectorstore, k=args.k)
+        result = asyncio.run(evaluate(retriever, queries, mode))
+        print(f"{mode or 'auto':<10} {result['hit@k']:>6.2f} {result['mrr']:>6.2f} {result['p50_ms']:>8.1f} "
+              f"{result['p95_ms']:>8.1f} {retriever.stats['embedding_calls']:>12}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
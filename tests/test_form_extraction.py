@@ -0,0 +1,55 @@
+"""Local extraction of contact form fields (api/services/form_extraction.py) and how it merges with the model's."""
+import pytest
+
+from api.services.conversation import empty_session, graph_inputs, turn_form_data
+from api.services.form_extraction import classify_event_type, extract_form_fields
+
+
+@pytest.mark.parametrize("message, name", [
+    ("Hola, me llamo Lucía Martín", "Lucía Martín"),
+    ("Me llamo María del Carmen López y quiero información", "María del Carmen López"),
+    ("mi nombre es Juan de la Cruz", "Juan de la Cruz"),
+    ("Me llamo Lucía Martín De La Fuente Pérez", "Lucía Martín De La Fuente Pérez"),
+    ("My name is Anna", "Anna"),
+    ("Me llamo Ana y quiero casarme en junio", "Ana"),
+    ("Soy Vegetariana y quiero un menú", None),
+    ("¿Qué servicios ofrecéis?", None),
+])
+def test_name(message, name):
+    assert extract_form_fields(message).get("name") == name
+
+
+@pytest.mark.parametrize("message, fields", [
+    ("Escribidme a lucia.martin@example.com", {"email": "lucia.martin@example.com"}),
+    ("Mi teléfono es +34 612 34 56 78", {"phone": "+34612345678"}),
+    ("Somos 120 invitados el 12/06/2026 y el presupuesto es 15.000€", {}),
+])
+def test_contact_details(message, fields):
+    found = extract_form_fields(message)
+    assert {key: found[key] for key in ("email", "phone") if key in found} == fields
+
+
+@pytest.mark.parametrize("message, event_type", [
+    ("Queremos celebrar nuestra boda", "Wedding"),
+    ("Es el cumpleaños de mi hija", "Birthday / Social"),
+    ("Organizamos un congreso de empresa", "Corporate"),
+    ("Una fiesta de empresa para una boda", None),
+    ("Hola", None),
+])
+def test_event_type(message, event_type):
+    assert classify_event_type(message) == event_type
+
+
+def test_model_name_wins_over_local_name_but_not_contact_details():
+    message = "Me llamo María del Carmen, mi email es mc@example.com"
+    model = {"name": "María del Carmen López", "email": "mc@example.con"}
+    assert turn_form_data(empty_session(), message, model) == {
+        "name": "María del Carmen López",
+        "email": "mc@example.com",
+    }
+    assert turn_form_data(empty_session(), message, {}) == {"name": "María del Carmen", "email": "mc@example.com"}
+
+
+def test_only_contact_details_are_passed_as_collected():
+    inputs = graph_inputs("Me llamo Lucía, mi teléfono es 612345678", empty_session())
+    assert inputs["form_data"] == {"phone": "612345678"}
@@ -0,0 +1,115 @@
+"""
+Ordering, retry and conflict paths of the write-behind turn writer, against the
+in-memory Firestore of the offline benchmark. Run with `python -m pytest tests`.
+"""
+import asyncio
+
+from bench.fakes import InMemoryFirestore
+from api.services.history import all_turns, append_turns
+from api.services.write_behind import TurnWriter
+
+
+def _writer() -> TurnWriter:
+    # A long interval keeps the background flusher out of the way: the tests flush explicitly.
+    return TurnWriter(enabled=True, flush_interval=60, max_pending=1000, max_retries=0)
+
+
+async def _stored(db, session_id):
+    return [(turn["seq"], turn["role"], turn["content"]) for turn in await all_turns(db, session_id)]
+
+
+def test_overlay_shows_unwritten_turns_once():
+    async def scenario():
+        db, writer = InMemoryFirestore(), _writer()
+        await writer.append(db, "s", 0, [("user", "a"), ("assistant", "A")], {"form_data": {"name": "Ana"}})
+
+        session = await writer.load_session(db, "s")
+        assert session["history"] == [("user", "a"), ("assistant", "A")]
+        assert session["next_seq"] == 2
+        assert session["form_data"] == {"name": "Ana"}
+
+        assert await writer.flush()
+        session = await writer.load_session(db, "s")
+        assert session["history"] == [("user", "a"), ("assistant", "A")]
+        assert await _stored(db, "s") == [(0, "user", "a"), (1, "assistant", "A")]
+        await writer.drain()
+
+    asyncio.run(scenario())
+
+
+def test_overlay_keeps_own_turns_when_another_worker_took_their_seq():
+    async def scenario():
+        db, writer = InMemoryFirestore(), _writer()
+        await writer.append(db, "s", 0, [("user", "a"), ("assistant", "A")])
+        await append_turns(db, "s", 0, [("user", "x"), ("assistant", "X")])  # Another worker
+
+        session = await writer.load_session(db, "s")
+        assert session["history"] == [("user", "x"), ("assistant", "X"), ("user", "a"), ("assistant", "A")]
+        await writer.drain()
+
+    asyncio.run(scenario())
+
+
+def test_conflict_resequences_turns_and_shifts_newer_ones():
+    async def scenario():
+        db, writer = InMemoryFirestore(latency=0.01), _writer()
+        await writer.append(db, "s", 0, [("user", "a"), ("assistant", "A")])
+        await append_turns(db, "s", 0, [("user", "x"), ("assistant", "X")])  # Another worker
+
+        flush = asyncio.create_task(writer.flush())
+        await asyncio.sleep(0.005)  # The batch commit is in flight
+        session = await writer.load_session(db, "s")
+        await writer.append(db, "s", session["next_seq"], [("user", "b"), ("assistant", "B")])
+        assert await flush
+        assert writer.stats["conflicts"] == 1
+
+        assert await writer.flush()
+        assert await _stored(db, "s") == [
+            (0, "user", "x"), (1, "assistant", "X"),
+            (2, "user", "a"), (3, "assistant", "A"),
+            (4, "user", "b"), (5, "assistant", "B"),
+        ]
+        session = await writer.load_session(db, "s")
+        assert session["next_seq"] == 6
+        assert [content for _, content in session["history"]] == ["x", "X", "a", "A", "b", "B"]
+        await writer.drain()
+
+    asyncio.run(scenario())
+
+
+def test_failed_commit_is_requeued_ahead_of_newer_turns():
+    async def scenario():
+        db, writer = InMemoryFirestore(), _writer()
+        failures = [RuntimeError("unavailable")]
+        batch_class = type(db.batch())
+        commit = batch_class.commit
+
+        async def flaky_commit(self):
+            if failures:
+                raise failures.pop()
+            await commit(self)
+
+        batch_class.commit = flaky_commit
+        try:
+            await writer.append(db, "s1", 0, [("user", "a"), ("assistant", "A")])
+            assert not await writer.flush()
+            assert writer.stats["failed_commits"] == 1
+
+            await writer.append(db, "s2", 0, [("user", "z"), ("assistant", "Z")])
+            await writer.append(db, "s1", 2, [("user", "b"), ("assistant", "B")])
+            assert list(writer._pending) == ["s1", "s2"]
+            # The next request still sees every turn of the failed commit.
+            session = await writer.load_session(db, "s1")
+            assert [content for _, content in session["history"]] == ["a", "A", "b", "B"]
+
+            assert await writer.flush()
+        finally:
+            batch_class.commit = commit
+
+        assert await _stored(db, "s1") == [
+            (0, "user", "a"), (1, "assistant", "A"), (2, "user", "b"), (3, "assistant", "B"),
+        ]
+        assert await _stored(db, "s2") == [(0, "user", "z"), (1, "assistant", "Z")]
+        await writer.drain()
+
+    asyncio.run(scenario())